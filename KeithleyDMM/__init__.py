@@ -1,4 +1,34 @@
 #!/bin/python3
+import sys
+import types
+import importlib
 
-from KeithleyDMM.keithley196 import keithley196
-from KeithleyDMM.keithley199 import keithley199
+# Model classes are imported on first use, so only the model that is actually used gets loaded
+_MODELS = ('keithley196', 'keithley199')
+
+
+# ==========================================================================
+# Lazy access to model classes (KeithleyDMM.keithley196 etc.)
+# ==========================================================================
+def __getattr__(name):
+    if name in _MODELS:
+        return getattr(importlib.import_module('KeithleyDMM.' + name), name)
+    raise AttributeError("module 'KeithleyDMM' has no attribute '" + name + "'")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_MODELS))
+
+
+# ==============================================================================
+# Importing a model submodule sets it as attribute of the package, keep the
+# model class there instead (KeithleyDMM.keithley196 is the class, not the module)
+# ==============================================================================
+class _package(types.ModuleType):
+
+    def __setattr__(self, name, value):
+        if name in _MODELS and isinstance(value, types.ModuleType):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = _package
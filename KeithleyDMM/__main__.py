@@ -0,0 +1,8 @@
+#!/bin/python3
+
+# ==============================================================================
+# python3 -m KeithleyDMM: unified command line interface (see cli.py)
+# ==============================================================================
+if __name__=="__main__":
+    from KeithleyDMM import cli
+    cli.main()
@@ -0,0 +1,221 @@
+#!/bin/python3
+import os
+import time
+import signal
+import multiprocessing
+
+from KeithleyDMM import cli
+from KeithleyDMM import shmbuffer
+from KeithleyDMM import streaming
+
+# ==============================================================================
+# Multi-board acquisition with one worker process per GPIB board
+#
+# Each worker process owns the instruments on one GPIB board (port), reads
+# them in turn and appends the readings to one shared memory ring buffer per
+# instrument (see shmbuffer). Consumers in any process read the buffers without
+# pickling. Boards are read in parallel without sharing a GIL, so throughput
+# scales with the number of boards.
+#
+# Workers ignore SIGINT. On Ctrl-C the manager process stops them through a
+# shared event, and removes the buffers when it is closed.
+# ==============================================================================
+
+
+# ==========================================================================
+# Default instrument factory: driver of model on a pooled GPIB session
+# ==========================================================================
+def open_instrument(model, pad, port):
+    return cli.load_model(model)(pad, port)
+
+
+# ==========================================================================
+# Instrument factory for testing: driver connected to a simulated instrument
+# (use functools.partial to pass simulator arguments, e.g. latency)
+# ==========================================================================
+def open_simulated(model, pad, port, **kwargs):
+    from KeithleyDMM import simulator
+    return cli.load_model(model)(pad, port, inst=simulator.simulated_instrument(model, **kwargs))
+
+
+# ==========================================================================
+# Worker process: read instruments of one board into shared buffers until stop is set
+# ==========================================================================
+def _worker(port, specs, names, factory, interval, stop):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    buffers = [shmbuffer.shared_reading_buffer(name) for name in names]
+    instruments = []
+    perf_ns = time.perf_counter_ns
+    try:
+        for b in buffers:
+            b.set_pid(os.getpid())
+            b.beat()
+        for model, pad in specs:
+            instruments.append(factory(model, pad, port))
+        pairs = list(zip(instruments, buffers))
+        for n in streaming.ticks(None, interval):
+            if stop.is_set():
+                break
+            for inst, b in pairs:
+                try:
+                    v = inst._read()
+                except Exception:
+                    b.error()
+                    continue
+                b.append(perf_ns(), v, inst.unit_code)
+                b.beat()
+    finally:
+        for inst in instruments:
+            inst.close()
+        for b in buffers:
+            b.close()
+
+
+class acquisition_manager:
+
+    # ==========================================================================
+    # Class constructor
+    # instruments:   list of (model, pad, port) tuples, e.g. [('196', 7, 0), ('199', 1, 1)]
+    # capacity:      readings held per instrument buffer
+    # interval:      time between reading rounds of a board in seconds (None = as fast as possible)
+    # factory:       function(model, pad, port) returning a driver instance (must be picklable)
+    # stall_timeout: seconds without progress after which a worker counts as stalled
+    # ==========================================================================
+    def __init__(self, instruments, capacity=100000, interval=None, factory=open_instrument, stall_timeout=5.0):
+        self.boards = {}
+        for model, pad, port in instruments:
+            self.boards.setdefault(port, []).append((str(model), pad))
+        self.capacity = capacity
+        self.interval = interval
+        self.factory = factory
+        self.stall_timeout = stall_timeout
+        self.buffers = {}
+        self.workers = {}
+        self.restarts = {port: 0 for port in self.boards}
+        self._stop = multiprocessing.Event()
+
+
+    # ==========================================================================
+    # Create buffers and start one worker per board
+    # ==========================================================================
+    def start(self):
+        self._stop.clear()
+        prefix = 'kdmm_' + str(os.getpid()) + '_' + hex(id(self))[2:] + '_'
+        for port, specs in self.boards.items():
+            for model, pad in specs:
+                if (port, pad) not in self.buffers:
+                    self.buffers[(port, pad)] = shmbuffer.shared_reading_buffer(
+                        prefix + str(port) + '_' + str(pad), self.capacity)
+            self._start_worker(port)
+
+    def _start_worker(self, port):
+        names = [self.buffers[(port, pad)].name for model, pad in self.boards[port]]
+        p = multiprocessing.Process(target=_worker, name='GPIB' + str(port),
+                                    args=(port, self.boards[port], names, self.factory, self.interval, self._stop))
+        p.daemon = True
+        p.start()
+        self.workers[port] = p
+
+
+    # ==========================================================================
+    # Shared buffer of an instrument (shmbuffer.shared_reading_buffer)
+    # ==========================================================================
+    def buffer(self, port, pad):
+        return self.buffers[(port, pad)]
+
+
+    # ==========================================================================
+    # Shared memory names of all buffers keyed by (port, pad), for consumers in other processes
+    # ==========================================================================
+    def buffer_names(self):
+        return {key: b.name for key, b in self.buffers.items()}
+
+
+    # ==========================================================================
+    # Health of each board: worker state, heartbeat age and reading/error counts
+    # ==========================================================================
+    def health(self):
+        now = time.monotonic_ns()
+        out = {}
+        for port, p in self.workers.items():
+            bufs = [self.buffers[(port, pad)] for model, pad in self.boards[port]]
+            beat = max(b.heartbeat_ns for b in bufs)
+            age = (now - beat) / 1e9 if beat else None
+            out[port] = {
+                'alive': p.is_alive(),
+                'exitcode': p.exitcode,
+                'pid': p.pid,
+                'heartbeat_age_s': age,
+                'stalled': age is not None and age > self.stall_timeout,
+                'readings': sum(b.total for b in bufs),
+                'errors': sum(b.errors for b in bufs),
+                'restarts': self.restarts[port],
+            }
+        return out
+
+
+    # ==========================================================================
+    # Restart workers that have died or stalled, return list of restarted ports
+    # ==========================================================================
+    def check(self):
+        restarted = []
+        if self._stop.is_set():
+            return restarted
+        for port, h in self.health().items():
+            if not h['alive'] or h['stalled']:
+                p = self.workers[port]
+                if p.is_alive():
+                    p.terminate()
+                p.join(1.0)
+                self.restarts[port] += 1
+                self._start_worker(port)
+                restarted.append(port)
+        return restarted
+
+
+    # ==========================================================================
+    # Stop workers (terminate those not stopping within timeout seconds)
+    # ==========================================================================
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for p in self.workers.values():
+            p.join(max(0.0, deadline - time.monotonic()))
+        for p in self.workers.values():
+            if p.is_alive():
+                p.terminate()
+                p.join()
+        self.workers = {}
+
+
+    # ==========================================================================
+    # Stop workers and remove shared buffers
+    # ==========================================================================
+    def close(self):
+        self.stop()
+        for b in self.buffers.values():
+            b.close()
+        self.buffers = {}
+
+
+    # ==========================================================================
+    # Supervise workers until interrupted (Ctrl-C) or duration seconds have passed
+    # callback: optional function called with health() every period seconds
+    # ==========================================================================
+    def run(self, duration=None, period=1.0, callback=None):
+        end = None if duration is None else time.monotonic() + duration
+        try:
+            while end is None or time.monotonic() < end:
+                time.sleep(period if end is None else max(0.0, min(period, end - time.monotonic())))
+                self.check()
+                if callback is not None:
+                    callback(self.health())
+        except KeyboardInterrupt:
+            pass
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
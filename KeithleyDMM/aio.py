@@ -0,0 +1,61 @@
+#!/bin/python3
+import asyncio
+import functools
+import threading
+import concurrent.futures
+
+# ==============================================================================
+# asyncio support
+#
+# Blocking bus operations are run in one worker thread per GPIB board (port),
+# so instruments on different boards are accessed in parallel while accesses
+# to instruments sharing a board are serialized.
+# ==============================================================================
+
+# Single thread executors, keyed by GPIB port number
+_executors = {}
+_lock = threading.Lock()
+
+
+# ==========================================================================
+# Get (and if needed create) the executor serializing access to a GPIB board
+# ==========================================================================
+def board_executor(port):
+    with _lock:
+        if port not in _executors:
+            _executors[port] = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='GPIB' + str(port))
+        return _executors[port]
+
+
+# ==========================================================================
+# Run a blocking instrument method in the executor of the instrument's GPIB board
+# ==========================================================================
+async def run(inst, fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(board_executor(inst.port), functools.partial(fn, *args))
+
+
+# ==========================================================================
+# Read all instruments concurrently and return list of measurement values
+# ==========================================================================
+async def gather_read(*instruments):
+    return await asyncio.gather(*[run(i, i.read) for i in instruments])
+
+
+# ==========================================================================
+# Read all instruments concurrently and return list of (value, units) tuples
+# ==========================================================================
+async def gather_read_units(*instruments):
+    def read_units(i):
+        return i.read(), i.units
+    return await asyncio.gather(*[run(i, read_units, i) for i in instruments])
+
+
+# ==========================================================================
+# Shut down board executors (waits for pending operations to finish)
+# ==========================================================================
+def shutdown():
+    with _lock:
+        for e in _executors.values():
+            e.shutdown(wait=True)
+        _executors.clear()
@@ -0,0 +1,208 @@
+#!/bin/python3
+import re
+import time
+import collections
+
+from KeithleyDMM import streaming
+
+# ==============================================================================
+# Software range control
+#
+# Instrument autorange (R0) re-ranges after a reading went out of range, which
+# adds a long and unpredictable delay to that reading. The range controller
+# keeps the instrument on a fixed range instead and changes the range from the
+# readings it sees: it switches up before the reading is expected to leave the
+# range (value extrapolated with a smoothed slope) and switches down only after
+# several readings fit into the next lower range (hysteresis).
+# ==============================================================================
+
+# Unit prefixes used in RANGE_TABLE strings
+_PREFIXES = {'u': 1e-6, 'm': 1e-3, '': 1.0, 'k': 1e3, 'M': 1e6}
+_FULL_SCALE_RE = re.compile(r'^([0-9.]+)\s*([umkM]?)')
+
+
+# ==========================================================================
+# Full scale value of a RANGE_TABLE entry ('300 mVDC' -> 0.3), None for 'auto' entries
+# ==========================================================================
+def full_scale(label):
+    m = _FULL_SCALE_RE.match(label)
+    if m is None:
+        return None
+    return float(m.group(1)) * _PREFIXES[m.group(2)]
+
+
+# ==========================================================================
+# Distinct fixed ranges of one RANGE_TABLE row as list of (range number, full scale), ascending
+# ==========================================================================
+def fixed_ranges(row):
+    ranges = []
+    for rng, label in enumerate(row):
+        fs = full_scale(label)
+        if fs is not None and (not ranges or fs > ranges[-1][1]):
+            ranges.append((rng, fs))
+    return ranges
+
+
+# ==============================================================================
+# Range switching decision record:
+#   t_ns       time.perf_counter_ns() timestamp
+#   function   measurement function number
+#   old, new   range numbers (0 = instrument was on autorange)
+#   value      reading that caused the decision
+#   predicted  extrapolated next reading
+#   reason     'init', 'up', 'down' or 'overflow'
+# ==============================================================================
+range_decision = collections.namedtuple('range_decision', ['t_ns', 'function', 'old', 'new', 'value', 'predicted', 'reason'])
+
+
+class range_controller:
+
+    # ==========================================================================
+    # Class constructor
+    # inst:      keithley19x instrument
+    # up:        switch up when the (predicted) reading exceeds this fraction of full scale
+    # down:      switch down when readings are below this fraction of the next lower range full scale ...
+    # hold:      ... for this number of consecutive readings
+    # lookahead: number of readings to extrapolate the reading trend ahead (0 = no prediction)
+    # smoothing: weight of the newest difference in the smoothed slope (0 to 1)
+    # log_size:  number of decisions kept in decisions
+    # callback:  optional function called with each range_decision
+    # ==========================================================================
+    def __init__(self, inst, up=0.9, down=0.8, hold=3, lookahead=1.0, smoothing=0.5, log_size=1000, callback=None):
+        if not 0 < down < 1:
+            raise ValueError("Down threshold must be between 0 and 1")
+        if not 0 < up <= 1:
+            raise ValueError("Up threshold must be between 0 and 1")
+        if not isinstance(hold, int) or hold < 1:
+            raise ValueError("Hold must be a positive int")
+        if not 0 < smoothing <= 1:
+            raise ValueError("Smoothing must be between 0 and 1")
+        self.inst = inst
+        self.up = up
+        self.down = down
+        self.hold = hold
+        self.lookahead = lookahead
+        self.smoothing = smoothing
+        self.callback = callback
+        self.decisions = collections.deque(maxlen=log_size)
+        self.switches = 0
+        self.overflows = 0
+        # Ranges of the current function and index of the active one (None until first reading)
+        self._function = None
+        self._ranges = []
+        self._level = None
+        self._below = 0
+        self._last = None
+        self._slope = 0.0
+
+
+    # ==========================================================================
+    # Load ranges of the current measurement function and leave autorange
+    # ==========================================================================
+    def _setup(self):
+        inst = self.inst
+        inst.refresh_status()
+        self._function = inst.status_function
+        self._ranges = fixed_ranges(inst.RANGE_TABLE[inst.status_function])
+        self._level = None
+        self._below = 0
+        self._last = None
+        self._slope = 0.0
+        if not self._ranges:
+            # Function without fixed ranges (dB): readings are passed through
+            return
+        for level, (rng, fs) in enumerate(self._ranges):
+            if inst.RANGE_TABLE[self._function][inst.status_range] == inst.RANGE_TABLE[self._function][rng]:
+                self._level = level
+                return
+        # Instrument is on autorange: start on the highest range, readings will bring it down
+        self._switch(len(self._ranges) - 1, None, None, 'init')
+
+
+    # ==========================================================================
+    # Change to range level and log decision
+    # ==========================================================================
+    def _switch(self, level, value, predicted, reason):
+        old = self.inst.status_range
+        new = self._ranges[level][0]
+        self.inst.range(new)
+        self._level = level
+        self._below = 0
+        self.switches += 1
+        d = range_decision(time.perf_counter_ns(), self._function, old, new, value, predicted, reason)
+        self.decisions.append(d)
+        if self.callback is not None:
+            self.callback(d)
+
+
+    # ==========================================================================
+    # Take a reading with read, retrying on higher ranges while it overflows
+    # ==========================================================================
+    def _take(self, read):
+        inst = self.inst
+        if not inst.status_valid or inst.status_function != self._function:
+            self._setup()
+        v = read()
+        if self._level is None:
+            return v
+        top = len(self._ranges) - 1
+        while inst.overflow and self._level < top:
+            self.overflows += 1
+            self._switch(self._level + 1, v, None, 'overflow')
+            v = read()
+        self._update(v)
+        return v
+
+
+    # ==========================================================================
+    # Update trend with reading and decide on next range
+    # ==========================================================================
+    def _update(self, v):
+        if self._last is not None:
+            self._slope += self.smoothing * ((v - self._last) - self._slope)
+        self._last = v
+        predicted = v + self._slope * self.lookahead
+        mag = max(abs(v), abs(predicted))
+
+        level = self._level
+        top = len(self._ranges) - 1
+        # Switch up ahead of time, as far as needed for the predicted reading
+        if mag > self.up * self._ranges[level][1] and level < top:
+            while level < top and mag > self.up * self._ranges[level][1]:
+                level += 1
+            self._switch(level, v, predicted, 'up')
+        # Switch down one range when readings stay low enough
+        elif level > 0 and mag < self.down * self._ranges[level - 1][1]:
+            self._below += 1
+            if self._below >= self.hold:
+                self._switch(level - 1, v, predicted, 'down')
+        else:
+            self._below = 0
+
+
+    # ==========================================================================
+    # Read instrument and adjust range, return measurement value
+    # ==========================================================================
+    def read(self):
+        return self._take(self.inst.read)
+
+
+    # ==========================================================================
+    # Generate streaming.reading records with range control (see keithley_dmm.stream())
+    # ==========================================================================
+    def stream(self, count=None, interval=None):
+        return streaming.generate(self.inst, lambda: self._take(self.inst._read), count, interval)
+
+
+    # ==========================================================================
+    # Return switching summary and logged decisions as dict
+    # ==========================================================================
+    def report(self):
+        reasons = collections.Counter(d.reason for d in self.decisions)
+        return {
+            'switches': self.switches,
+            'overflows': self.overflows,
+            'range': self.inst.status_range,
+            'reasons': dict(reasons),
+            'decisions': [d._asdict() for d in self.decisions],
+        }
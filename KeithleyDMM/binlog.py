@@ -0,0 +1,200 @@
+#!/bin/python3
+import os
+import sys
+import json
+import time
+import struct
+
+from KeithleyDMM import parser
+
+# ==============================================================================
+# Append-only binary reading log
+#
+# File layout: fixed size header followed by fixed width little endian records
+#
+#   header  magic (8 bytes), version (u16), record size (u16), header size (u32),
+#           creation time (i64, ns since epoch), JSON list of instrument names
+#           (zero padded up to header size)
+#   record  timestamp (i64, ns since epoch), value (f64), instrument id (u16),
+#           unit code (i8, see parser.UNIT_CODES), flags (u8), padding (4 bytes)
+#
+# Records can be mapped as a NumPy structured array without copying (see open_log()).
+# ==============================================================================
+
+MAGIC = b'KDMMLOG\x00'
+VERSION = 1
+HEADER_SIZE = 512
+HEADER_STRUCT = struct.Struct('<8sHHIq')
+RECORD_STRUCT = struct.Struct('<qdHbB4x')
+RECORD_SIZE = RECORD_STRUCT.size
+
+# Record flags (FLAG_MIN / FLAG_MAX mark bucket extremes written by decimate.log_records())
+FLAG_OVERFLOW = 1
+FLAG_MIN = 2
+FLAG_MAX = 4
+
+# NumPy dtype matching RECORD_STRUCT
+def record_dtype():
+    import numpy as np
+    return np.dtype({'names': ['t_ns', 'value', 'inst', 'unit', 'flags'],
+                     'formats': ['<i8', '<f8', '<u2', 'i1', 'u1'],
+                     'offsets': [0, 8, 16, 18, 19],
+                     'itemsize': RECORD_SIZE})
+
+
+# ==========================================================================
+# Pack header
+# ==========================================================================
+def _make_header(names, created_ns):
+    h = HEADER_STRUCT.pack(MAGIC, VERSION, RECORD_SIZE, HEADER_SIZE, created_ns)
+    h += json.dumps(list(names)).encode('utf-8')
+    if len(h) > HEADER_SIZE:
+        raise ValueError("Too many instrument names for log header")
+    return h + b'\x00' * (HEADER_SIZE - len(h))
+
+
+# ==========================================================================
+# Read and check header, return dict with header fields
+# ==========================================================================
+def read_header(f):
+    h = f.read(HEADER_STRUCT.size)
+    if len(h) < HEADER_STRUCT.size:
+        raise ValueError("Not a reading log file (too short)")
+    magic, version, record_size, header_size, created_ns = HEADER_STRUCT.unpack(h)
+    if magic != MAGIC:
+        raise ValueError("Not a reading log file (bad magic)")
+    if version != VERSION or record_size != RECORD_SIZE:
+        raise ValueError("Unsupported reading log version")
+    names = f.read(header_size - HEADER_STRUCT.size).rstrip(b'\x00')
+    return {
+        'version': version,
+        'record_size': record_size,
+        'header_size': header_size,
+        'created_ns': created_ns,
+        'names': json.loads(names.decode('utf-8')) if names else [],
+    }
+
+
+class log_writer:
+
+    # ==========================================================================
+    # Class constructor: create new log file or open existing one for appending
+    # names: instrument names, the instrument id of a record is the index into this list
+    # ==========================================================================
+    def __init__(self, path, names=()):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                self.header = read_header(f)
+            if names and list(names) != self.header['names']:
+                raise ValueError("Instrument names do not match existing log file")
+            # Drop partially written trailing record (e.g. after a crash)
+            size = os.path.getsize(path) - self.header['header_size']
+            if size % RECORD_SIZE:
+                with open(path, 'r+b') as f:
+                    f.truncate(self.header['header_size'] + size - size % RECORD_SIZE)
+            self.f = open(path, 'ab')
+        else:
+            created_ns = time.time_ns()
+            self.f = open(path, 'wb')
+            self.f.write(_make_header(names, created_ns))
+            self.header = {'version': VERSION, 'record_size': RECORD_SIZE, 'header_size': HEADER_SIZE,
+                           'created_ns': created_ns, 'names': list(names)}
+        self._pack = RECORD_STRUCT.pack
+
+
+    # ==========================================================================
+    # Append one record
+    # ==========================================================================
+    def write(self, t_ns, inst, value, unit, flags=0):
+        self.f.write(self._pack(t_ns, value, inst, unit, flags))
+
+
+    # ==========================================================================
+    # Append NumPy structured array of records (dtype record_dtype())
+    # ==========================================================================
+    def write_array(self, records):
+        import numpy as np
+        self.f.write(np.ascontiguousarray(records, dtype=record_dtype()).tobytes())
+
+
+    # ==========================================================================
+    # Flush buffered records to file
+    # ==========================================================================
+    def flush(self):
+        self.f.flush()
+
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# ==========================================================================
+# Map log file as NumPy structured array (no copy), return (header, records)
+# ==========================================================================
+def open_log(path):
+    import numpy as np
+    with open(path, 'rb') as f:
+        header = read_header(f)
+    n = (os.path.getsize(path) - header['header_size']) // RECORD_SIZE
+    if n == 0:
+        return header, np.empty(0, dtype=record_dtype())
+    records = np.memmap(path, dtype=record_dtype(), mode='r', offset=header['header_size'], shape=(n,))
+    return header, records
+
+
+# ==========================================================================
+# Export log file to CSV text (date; time; instrument; value; units)
+# ==========================================================================
+def export_csv(path, out_path, chunk=65536):
+    header, records = open_log(path)
+    names = header['names']
+    with open(out_path, 'w') as out:
+        for start in range(0, len(records), chunk):
+            r = records[start:start + chunk]
+            lines = []
+            for t_ns, value, inst, unit, flags in zip(r['t_ns'].tolist(), r['value'].tolist(),
+                                                      r['inst'].tolist(), r['unit'].tolist(), r['flags'].tolist()):
+                s = t_ns // 1000000000
+                d = time.strftime('%Y-%m-%d; %H:%M:%S', time.localtime(s))
+                name = names[inst] if inst < len(names) else str(inst)
+                units = parser.UNIT_NAMES[unit] if 0 <= unit < len(parser.UNIT_NAMES) else ''
+                lines.append(d + '.%06d; ' % ((t_ns % 1000000000) // 1000) + name + '; ' + repr(value) + '; ' + units
+                             + ('; MIN' if flags & FLAG_MIN else '') + ('; MAX' if flags & FLAG_MAX else '')
+                             + ('; OVERFLOW' if flags & FLAG_OVERFLOW else '') + '\n')
+            out.write(''.join(lines))
+
+
+# ==============================================================================
+# When running as standalone program
+# ==============================================================================
+if __name__ == "__main__":
+
+    def print_usage():
+        print('''
+binlog.py - binary reading log tool
+
+Usage:
+    python3 -m KeithleyDMM.binlog info LOGFILE
+    python3 -m KeithleyDMM.binlog export LOGFILE CSVFILE
+        ''')
+
+    argv = sys.argv[1:]
+    if len(argv) == 2 and argv[0] == 'info':
+        header, records = open_log(argv[1])
+        print('Created ..... ' + time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(header['created_ns'] // 1000000000)))
+        print('Instruments . ' + ', '.join(header['names']))
+        print('Records ..... ' + str(len(records)))
+    elif len(argv) == 3 and argv[0] == 'export':
+        export_csv(argv[1], argv[2])
+    else:
+        print_usage()
+        sys.exit(1)
@@ -0,0 +1,247 @@
+#!/bin/python3
+import os
+import sys
+import getopt
+import importlib
+
+# ==============================================================================
+# Command line interface shared by all models
+#
+# Used by the keithley-dmm script / python3 -m KeithleyDMM (model selected with -m)
+# and by python3 -m KeithleyDMM.keithley196 etc. Only the selected model module is
+# imported, pyvisa is imported when the instrument is first accessed.
+# ==============================================================================
+
+DEFAULT_MODEL = '196'
+
+
+# ==========================================================================
+# Print help
+# ==========================================================================
+def print_usage(cls, name=None):
+    if name is None:
+        name = 'keithley' + cls.MODEL + '.py'
+    if name == 'keithley-dmm':
+        model_help = '    -m [model]              Select instrument model (196 or 199, default is ' + DEFAULT_MODEL + ')\n'
+        model_opt = '[-m MODEL] '
+    else:
+        model_help = ''
+        model_opt = ''
+    if cls.FILTER_MAX > cls.FILTER_ON:
+        filter_help = ('    -P                      Enable digital filter (use -v to specify a custom filter value, the default value is ' + str(cls.FILTER_ON) + ')\n'
+                       '    -p                      Disable digital filter')
+    else:
+        filter_help = ('    -P                      Enable filter\n'
+                       '    -p                      Disable filter')
+    print('''
+''' + name[0].upper() + name[1:] + ''' standalone mode quick help
+
+Summary:
+    A simple scrip implementing some basic functionality for reading and controlling a Keithley ''' + cls.MODEL + ''' DMM over a GPIB bus
+    If no additional options are passed, the script will just read and print current measurement value form the default address ''' + str(cls.DEFAULT_PAD) + ''' on GPIB port 0
+
+Usage:
+    ''' + name + ''' ''' + model_opt + '''[-g PORT_NUM] [-a PAD] [-v VALUE] [-f FUNCTION|?] [-r RANGE|?] [-Z] [-z] [-P] [-p] [-D MSG] [-d] [-s] [-w] [-n COUNT] [-i INTERVAL] [-h]
+
+Options:
+''' + model_help + '''    -g [GPIB bus number]    Specify GPIB port number (default is 0)
+    -a [Primary address]    Specify GPIB primary address of the instrument (For K''' + cls.MODEL + ''' default is ''' + str(cls.DEFAULT_PAD) + ''')
+    -v [Some Value]         Specify a numeric value to use with some other function like zero offser or filter
+    -f [function]           Select measurement function (use parameter '?' to list valid functions)
+    -r [range]              Select measurement range (use parameter '?' to list valid ranges for selected measurement function)
+    -Z                      Enable zero mode (use -v for custom zero value, the default value is current measurement value)
+    -z                      Disable zero mode
+''' + filter_help + '''
+    -D [mesage]             Display a custom message (up to 10 characters) on the instrument display
+    -d                      Clear custom message display
+    -s                      Print instrument status
+    -w, --watch             Continuously print readings (one "value units" line per reading, stop with Ctrl+C)
+    -n, --count [count]     Print this number of readings
+    -i, --interval [sec]    Time between readings in watch/count mode (default is as fast as the bus allows)
+    -h, --help              Print this help message
+
+Examples:
+    ''' + name + ''' -f OHM -r 3    # Set measurement function to resistance and range to 3kOhm (note that function gets set first and than range)
+    ''' + name + ''' -Z -v 3.14159  # Enable zero offset with custom value of 3.14159
+    ''' + name + ''' -r ?           # List valid measurement ranges for current measurement function
+    ''' + name + ''' -D KEITHLEY    # Print "KEITHLEY" on instrument display
+    ''' + name + ''' -n 100 -i 0.5  # Print 100 readings, one every half second
+
+        ''')
+
+
+# ==========================================================================
+# Print Instrument status
+# ==========================================================================
+def print_status(k):
+    # Update status (only queries the instrument if cached status is not valid)
+    k.refresh_status()
+    # Print which primary address is beiong adressed on which GPIB port
+    print("Using primary address " + str(k.pad) + " on GPIB port " + str(k.port) )
+    print("\n --- Instrument status --- \n")
+    print("Function ... " + k.FUNCTION_UNITS[k.status_function])
+    print("Range ...... " + k.RANGE_TABLE[k.status_function][k.status_range])
+    print("Zero ....... " + k.ZERO_MODES[k.status_zero])
+    print("Filter ..... " + str(k.status_filter))
+    print("Rate ....... " + k.RATE_MODES[k.status_rate])
+    print("\n --- Instrument status --- \n")
+
+
+# ==========================================================================
+# Print valid measurement functions
+# ==========================================================================
+def print_functions(k):
+    print('Valid measurement functions:')
+    for f in range(len(k.FUNCTION_LIST)):
+        print('\'' + k.FUNCTION_LIST[f] + '\' = ' + k.FUCTION_NAMES[f])
+    print(' ')
+
+
+# ==========================================================================
+# Print valid ranges for current measurement function
+# ==========================================================================
+def print_ranges(k):
+    # Update status (only queries the instrument if cached status is not valid)
+    k.refresh_status()
+    print('Valid measurement ranges:')
+    ranges = []
+    for i, r in enumerate(k.RANGE_TABLE[k.status_function]):
+        if not r in ranges:
+            ranges.append(r)
+            print('\'' + str(i) + '\' = ' + r)
+    print(' ')
+
+
+# ==========================================================================
+# Load model class by model number ('196', '199')
+# ==========================================================================
+def load_model(model):
+    name = 'keithley' + str(model).lower().lstrip('k')
+    try:
+        module = importlib.import_module('KeithleyDMM.' + name)
+    except ImportError:
+        raise ValueError("Unknown model: " + str(model))
+    return getattr(module, name)
+
+
+# ==========================================================================
+# Print readings as they are taken (count=None: until interrupted)
+# ==========================================================================
+def watch(k, count=None, interval=None):
+    write = sys.stdout.write
+    flush = sys.stdout.flush
+    try:
+        for r in k.stream(count, interval):
+            write('%s %s\n' % (r.value, k.units or ''))
+            flush()
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # Output closed by reader (e.g. piped to head), do not complain at exit
+        sys.stdout = open(os.devnull, 'w')
+
+
+# ==========================================================================
+# Run command line interface for instrument class cls
+# (cls=None: unified keithley-dmm interface, model selected with -m)
+# ==========================================================================
+def main(cls=None, argv=None):
+    name = 'keithley-dmm' if cls is None else None
+    # Get comandline arguments
+    if argv is None:
+        argv = sys.argv[1:]
+    # Try to parse arguments
+    try:
+        opts, args = getopt.getopt(argv, 'm:g:a:hv:sr:f:zZpPdD:wn:i:',
+                                   ['model=', 'watch', 'count=', 'interval=', 'help'])
+    except getopt.GetoptError as err:
+        print(err)
+        print_usage(cls or load_model(DEFAULT_MODEL), name)
+        sys.exit(2)
+
+    # Select model class
+    if cls is None:
+        model = DEFAULT_MODEL
+        for opt, arg in opts:
+            if opt in ('-m', '--model'):
+                model = arg
+        try:
+            cls = load_model(model)
+        except ValueError as err:
+            print(err)
+            sys.exit(2)
+
+    # Default GPIB port number and instrument prmary address
+    gpib_port = 0
+    primary_addr = cls.DEFAULT_PAD
+
+    custom_val = 0
+
+    # Number of readings to print (None = until interrupted) and time between readings
+    count = 1
+    interval = None
+
+    # Parse arguments before initializing talking to the instrument
+    for opt, arg in opts:
+        if opt=='-g':       # Specify GPIB port number to use
+            gpib_port = int(arg)
+        elif opt=='-a':     # Specify instrument GPIB primary address
+            primary_addr = int(arg)
+        elif opt in ('-h', '--help'):   # Print help text
+            print_usage(cls, name)
+            sys.exit()
+        elif opt=='-v':     # Set custom parameter value
+            custom_val = float(arg)
+        elif opt in ('-w', '--watch'):  # Print readings until interrupted
+            count = None
+        elif opt in ('-n', '--count'):  # Print a number of readings
+            count = int(arg)
+        elif opt in ('-i', '--interval'):   # Time between readings
+            interval = float(arg)
+
+    # Instantiate instrument object
+    k = cls(primary_addr, gpib_port)
+
+    # Parse arguments after connecting to the instrument
+    for opt, arg in opts:
+        if opt=='-s':       # Print instrument status
+            print_status(k)
+        elif opt=='-r':     # Set measurement range
+            if arg == '?':
+                print_ranges(k)
+            else:
+                k.range(int(arg))
+        elif opt=='-f':     # Set measurement function
+            if arg == '?':
+                print_functions(k)
+            else:
+                k.function(arg)
+        elif opt=='-z':     # Disable zero mode
+            k.zero(0)
+        elif opt=='-Z':     # Enable zero mode
+            # Check if a custom parameter value has been specified
+            if custom_val != 0:
+                k.zero(2, custom_val)
+            else:
+                k.zero(1)
+        elif opt=='-p':     # Disable filter
+            k.filter(cls.FILTER_OFF)
+        elif opt=='-P':     # Enable filter
+            # Check if a custom parameter value has been specified (for models with adjustable filter)
+            if custom_val != 0 and cls.FILTER_MAX > cls.FILTER_ON:
+                k.filter(int(custom_val))
+            else:
+                k.filter(cls.FILTER_ON)
+        elif opt=='-D':   # Print a message on display
+            k.print(arg)
+        elif opt=='-d':   # Clear message from display
+            k.print('')
+
+
+    # Get reading valu and unit
+    if count == 1:
+        val = k.read()
+        unt = k.units
+        print(str(val) + " " + unt )
+    else:
+        watch(k, count, interval)
@@ -0,0 +1,49 @@
+#!/bin/python3
+from KeithleyDMM import parser
+
+# ==============================================================================
+# Helpers for block acquisition trough the instruments' internal data store
+# ==============================================================================
+
+# Maximum number of readings held by the data store
+DATA_STORE_SIZE = 500
+# Longest data store interval in ms (six digit status word field)
+DATA_STORE_MAX_RATE = 999999
+
+
+# ==========================================================================
+# Check data store parameters and assemble configuration command
+# ==========================================================================
+def store_command(rate, count):
+    if not isinstance(rate, int) or not isinstance(count, int):
+        raise TypeError("Data store rate and count must be int")
+    if rate < 1 or rate > DATA_STORE_MAX_RATE:
+        raise ValueError("Data store rate out of range (1 <= rate <= " + str(DATA_STORE_MAX_RATE) + " ms)")
+    if count < 1 or count > DATA_STORE_SIZE:
+        raise ValueError("Data store count out of range (1 <= count <= " + str(DATA_STORE_SIZE) + ")")
+    # Set data store size, then (re)start storing readings at the specified interval
+    return 'I' + str(count) + 'Q' + str(rate) + 'X'
+
+
+# ==========================================================================
+# Parse data store dump (G2 format: prefixed readings with ',Bnnn' buffer location suffixes)
+# into a NumPy structured array with buffer index, time offset and reading value fields
+# ==========================================================================
+def parse_store_dump(data, rate):
+    import numpy as np
+
+    fields = np.array(data.strip().split(','), dtype='S')
+    # Separate buffer location suffixes from readings
+    is_loc = fields.view(np.uint8).reshape(len(fields), fields.itemsize)[:, 0] == ord('B')
+    values, unit, overflow = parser.parse_readings(fields[~is_loc])
+
+    out = np.empty(len(values), dtype=[('index', np.int32), ('time', np.float64), ('value', np.float64)])
+    if np.any(is_loc):
+        out['index'] = np.char.lstrip(fields[is_loc], b'B').astype(np.int32)
+    else:
+        out['index'] = np.arange(len(values))
+    out['time'] = out['index'] * (rate / 1000.0)
+    out['value'] = values
+    # Sort by buffer location in case the instrument returns a wrapped buffer
+    out.sort(order='index')
+    return out
@@ -0,0 +1,331 @@
+#!/bin/python3
+import time
+
+# ==============================================================================
+# Streaming decimation for long-term logging
+#
+# Stages take readings in chunks of NumPy arrays (timestamps, values, unit
+# codes) and reduce each chunk with a few vectorized operations, so their cost
+# per reading is a small fraction of the cost of taking it:
+#
+#   block_average  count, min, max and mean of every n readings
+#   envelope       count, min, max and mean per time bucket, so short glitches
+#                  stay visible after decimation
+#   pyramid        envelopes at several resolutions, each level built from the
+#                  buckets of the level below (e.g. 1 s, 10 s, 100 s)
+#
+# Stages keep the incomplete block/bucket between chunks and emit it on
+# flush(). Output is returned from push() and also passed to an optional sink.
+# ==============================================================================
+
+
+# ==========================================================================
+# NumPy dtype of envelope records:
+#   t_ns      bucket start time (same time base as the input timestamps)
+#   count     number of valid readings in the bucket
+#   min, max  smallest and largest reading
+#   mean      mean of the readings
+#   unit      unit code (see parser.UNIT_CODES), a unit change starts a new bucket
+#   overflow  number of overflow readings (overflow flag set or NaN value),
+#             they are not included in count, min, max and mean
+# ==========================================================================
+def envelope_dtype():
+    import numpy as np
+    return np.dtype([('t_ns', '<i8'), ('count', '<u4'), ('min', '<f8'), ('max', '<f8'), ('mean', '<f8'),
+                     ('unit', 'i1'), ('overflow', '<u4')])
+
+
+# ==========================================================================
+# Per reading aggregates of a chunk: (timestamps, valid count, min, max, sum, unit codes, overflow count)
+# NaN values and readings with the overflow flag set only count as overflow, they are left out of count,
+# min, max and mean, so a single overflow does not swamp its block or bucket
+# ==========================================================================
+def _readings(t, v, u, overflow):
+    import numpy as np
+    t = np.asarray(t, dtype=np.int64)
+    v = np.asarray(v, dtype=np.float64)
+    bad = np.isnan(v)
+    if overflow is not None:
+        bad = bad | np.asarray(overflow, dtype=bool)
+    m = np.where(bad, np.nan, v)
+    return (t, (~bad).astype(np.int64), m, m, np.where(bad, 0.0, v),
+            np.broadcast_to(np.asarray(u, dtype=np.int8), v.shape), bad.astype(np.int64))
+
+
+# ==========================================================================
+# Build envelope records from aggregates (mean is NaN where a record holds no valid reading)
+# ==========================================================================
+def _records(t, count, lo, hi, total, unit, ovf):
+    import numpy as np
+    out = np.empty(len(t), dtype=envelope_dtype())
+    out['t_ns'] = t
+    out['count'] = count
+    out['min'] = lo
+    out['max'] = hi
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out['mean'] = np.where(count > 0, total / count, np.nan)
+    out['unit'] = unit
+    out['overflow'] = ovf
+    return out
+
+
+class block_average:
+
+    # ==========================================================================
+    # Class constructor
+    # n:    number of readings per block
+    # sink: optional function called with envelope records of completed blocks
+    # ==========================================================================
+    def __init__(self, n, sink=None):
+        if n < 1:
+            raise ValueError("Block size must be at least 1")
+        self.n = n
+        self.sink = sink
+        # Per reading aggregates of the incomplete block (see _readings())
+        self._open = None
+
+
+    # ==========================================================================
+    # Add chunk of readings, return envelope records of completed blocks
+    # (t_ns of a block is the timestamp of its first reading, a unit change ends the block early)
+    # u:        unit codes (array or single code, default 0)
+    # overflow: overflow flags (array or None)
+    # ==========================================================================
+    def push(self, t, v, u=0, overflow=None):
+        import numpy as np
+        agg = _readings(t, v, u, overflow)
+        if self._open is not None:
+            agg = tuple(np.concatenate((a, b)) for a, b in zip(self._open, agg))
+        t, count, lo, hi, total, unit, ovf = agg
+        size = len(t)
+        if not size:
+            return _records(*agg)
+        # Position of each reading within its run of equal unit codes, blocks start every n readings of a run
+        idx = np.arange(size)
+        run = np.concatenate(([True], unit[1:] != unit[:-1]))
+        pos = idx - np.maximum.accumulate(np.where(run, idx, 0))
+        starts = np.flatnonzero(pos % self.n == 0)
+        # The last block stays open until it is full or the unit changes
+        last = starts[-1]
+        if size - last < self.n:
+            self._open = tuple(a[last:] for a in agg)
+            starts = starts[:-1]
+            size = last
+        else:
+            self._open = None
+        if not len(starts):
+            return _records(*(a[:0] for a in agg))
+        out = _records(t[starts], np.add.reduceat(count[:size], starts), np.fmin.reduceat(lo[:size], starts),
+                       np.fmax.reduceat(hi[:size], starts), np.add.reduceat(total[:size], starts), unit[starts],
+                       np.add.reduceat(ovf[:size], starts))
+        if self.sink is not None:
+            self.sink(out)
+        return out
+
+
+    # ==========================================================================
+    # Emit incomplete block
+    # ==========================================================================
+    def flush(self):
+        import numpy as np
+        if self._open is None:
+            return np.empty(0, dtype=envelope_dtype())
+        t, count, lo, hi, total, unit, ovf = self._open
+        self._open = None
+        with np.errstate(invalid='ignore'):
+            out = _records(t[:1], [count.sum()], [np.fmin.reduce(lo)], [np.fmax.reduce(hi)], [total.sum()],
+                           unit[:1], [ovf.sum()])
+        if self.sink is not None:
+            self.sink(out)
+        return out
+
+
+class envelope:
+
+    # ==========================================================================
+    # Class constructor
+    # bucket: bucket length in seconds, buckets start at multiples of it
+    # sink:   optional function called with envelope records of completed buckets
+    # ==========================================================================
+    def __init__(self, bucket, sink=None):
+        self.bucket_ns = int(bucket * 1e9)
+        if self.bucket_ns <= 0:
+            raise ValueError("Bucket length must be positive")
+        self.sink = sink
+        # Aggregate of the open bucket (key, count, min, max, sum, unit, overflow), one element arrays
+        self._open = None
+
+
+    # ==========================================================================
+    # Add chunk of readings, return envelope records of completed buckets
+    # u:        unit codes (array or single code, default 0)
+    # overflow: overflow flags (array or None)
+    # ==========================================================================
+    def push(self, t, v, u=0, overflow=None):
+        t, count, lo, hi, total, unit, ovf = _readings(t, v, u, overflow)
+        return self._reduce(t // self.bucket_ns, count, lo, hi, total, unit, ovf)
+
+
+    # ==========================================================================
+    # Add envelope records of shorter buckets (e.g. from another envelope), return records of completed buckets
+    # ==========================================================================
+    def push_records(self, records):
+        import numpy as np
+        count = records['count'].astype(np.int64)
+        return self._reduce(records['t_ns'] // self.bucket_ns, count, records['min'], records['max'],
+                            np.where(count > 0, records['mean'] * count, 0.0), records['unit'],
+                            records['overflow'].astype(np.int64))
+
+
+    # ==========================================================================
+    # Emit the open bucket
+    # ==========================================================================
+    def flush(self):
+        import numpy as np
+        if self._open is None:
+            return np.empty(0, dtype=envelope_dtype())
+        out = self._records(*self._open)
+        self._open = None
+        if self.sink is not None:
+            self.sink(out)
+        return out
+
+
+    # ==========================================================================
+    # Aggregate per bucket: runs of equal bucket key and unit are reduced with ufunc.reduceat()
+    # ==========================================================================
+    def _reduce(self, key, count, lo, hi, total, unit, ovf):
+        import numpy as np
+        if self._open is not None:
+            key, count, lo, hi, total, unit, ovf = (np.concatenate((a, b)) for a, b in
+                                                    zip(self._open, (key, count, lo, hi, total, unit, ovf)))
+        if not len(key):
+            return np.empty(0, dtype=envelope_dtype())
+        starts = np.flatnonzero((key[1:] != key[:-1]) | (unit[1:] != unit[:-1])) + 1
+        starts = np.concatenate(([0], starts))
+        agg = (key[starts], np.add.reduceat(count, starts), np.fmin.reduceat(lo, starts),
+               np.fmax.reduceat(hi, starts), np.add.reduceat(total, starts), unit[starts],
+               np.add.reduceat(ovf, starts))
+        # The last bucket stays open until a later reading falls into another bucket
+        self._open = tuple(a[-1:] for a in agg)
+        out = self._records(*(a[:-1] for a in agg))
+        if self.sink is not None and len(out):
+            self.sink(out)
+        return out
+
+
+    def _records(self, key, count, lo, hi, total, unit, ovf):
+        return _records(key * self.bucket_ns, count, lo, hi, total, unit, ovf)
+
+
+class pyramid:
+
+    # ==========================================================================
+    # Class constructor
+    # bucket: bucket length of the finest level in seconds
+    # factor: bucket length ratio between neighbouring levels
+    # levels: number of levels
+    # sink:   optional function called with (level, envelope records) of completed buckets
+    # ==========================================================================
+    def __init__(self, bucket, factor=10, levels=3, sink=None):
+        if factor < 2:
+            raise ValueError("Factor must be at least 2")
+        self.factor = factor
+        self.sink = sink
+        self.levels = [envelope(bucket * factor ** k) for k in range(levels)]
+
+
+    # ==========================================================================
+    # Add chunk of readings, return list of envelope records of completed buckets per level
+    # ==========================================================================
+    def push(self, t, v, u=0, overflow=None):
+        out = [self.levels[0].push(t, v, u, overflow)]
+        for level in self.levels[1:]:
+            out.append(level.push_records(out[-1]))
+        self._emit(out)
+        return out
+
+
+    # ==========================================================================
+    # Emit the open buckets of all levels
+    # ==========================================================================
+    def flush(self):
+        import numpy as np
+        out = []
+        for n, level in enumerate(self.levels):
+            r = level.push_records(out[-1]) if n else level.flush()
+            if n:
+                r = np.concatenate((r, level.flush()))
+            out.append(r)
+        self._emit(out)
+        return out
+
+
+    def _emit(self, out):
+        if self.sink is not None:
+            for n, r in enumerate(out):
+                if len(r):
+                    self.sink(n, r)
+
+
+# ==========================================================================
+# Collect reading records (e.g. inst.stream()) into chunks of arrays (wall_ns, values, unit codes)
+# size:    maximum readings per chunk
+# timeout: maximum seconds a reading waits for its chunk to be emitted (None = no limit)
+# ==========================================================================
+def chunks(readings, size=1000, timeout=None):
+    import numpy as np
+    t = []
+    v = []
+    u = []
+    deadline = None
+    for r in readings:
+        t.append(r.wall_ns)
+        v.append(r.value)
+        u.append(r.unit)
+        if deadline is None and timeout is not None:
+            deadline = time.monotonic() + timeout
+        if len(t) >= size or (deadline is not None and time.monotonic() >= deadline):
+            yield np.array(t, dtype=np.int64), np.array(v, dtype=np.float64), np.array(u, dtype=np.int8)
+            t = []
+            v = []
+            u = []
+            deadline = None
+    if t:
+        yield np.array(t, dtype=np.int64), np.array(v, dtype=np.float64), np.array(u, dtype=np.int8)
+
+
+# ==========================================================================
+# Feed reading records through a stage (block_average, envelope or pyramid) and flush it at the end,
+# output goes to the stage's sink; return number of readings processed
+# ==========================================================================
+def run(readings, stage, size=1000, timeout=None):
+    n = 0
+    try:
+        for t, v, u in chunks(readings, size, timeout):
+            stage.push(t, v, u)
+            n += len(v)
+    finally:
+        stage.flush()
+    return n
+
+
+# ==========================================================================
+# Convert envelope records to binlog records: one min, max and mean record per bucket
+# (flags binlog.FLAG_MIN / FLAG_MAX, FLAG_OVERFLOW if the bucket held overflow readings)
+# wall_offset_ns: added to the bucket start times (e.g. ringbuffer.reading_buffer.wall_offset_ns)
+# ==========================================================================
+def log_records(records, inst, wall_offset_ns=0):
+    import numpy as np
+    from KeithleyDMM import binlog
+    n = len(records)
+    out = np.zeros(3 * n, dtype=binlog.record_dtype())
+    t = records['t_ns'] + wall_offset_ns
+    ovf = np.where(records['overflow'] > 0, binlog.FLAG_OVERFLOW, 0).astype(np.uint8)
+    for k, (field, flag) in enumerate((('min', binlog.FLAG_MIN), ('max', binlog.FLAG_MAX), ('mean', 0))):
+        out['t_ns'][k::3] = t
+        out['value'][k::3] = records[field]
+        out['unit'][k::3] = records['unit']
+        out['flags'][k::3] = ovf | flag
+    out['inst'] = inst
+    return out
@@ -0,0 +1,672 @@
+#!/bin/python3
+import time
+import contextlib
+
+from KeithleyDMM import session
+from KeithleyDMM import iostats
+from KeithleyDMM import datastore
+from KeithleyDMM import parser
+from KeithleyDMM import streaming
+
+# ==============================================================================
+# Shared driver core for Keithley 19x DMMs
+#
+# Model specific behaviour is described by class attributes of a subclass
+# (see keithley196.py and keithley199.py):
+#
+#   MODEL             model number prefix of the status word
+#   DEFAULT_PAD       default GPIB primary address
+#   FUNCTION_LIST     function mnemonics (index = F command argument)
+#   FUCTION_NAMES     function names
+#   FUNCTION_UNITS    function units
+#   READING_PREFIXES  reading prefix of each function
+#   RANGE_TABLE       range names of each function (index = R command argument)
+#   FILTER_MAX        largest P command argument
+#   FILTER_ON/OFF     P command arguments used by the CLI to enable/disable the filter
+#   STATUS_FIELDS     list of (name, width) of status word fields following the
+#                     model prefix, each field is saved as status_<name>
+#
+# The status word parser of each model is generated from STATUS_FIELDS once
+# when the model class is defined.
+# ==============================================================================
+
+
+# ==========================================================================
+# Generate status word parser from a list of (name, width) fields starting at offset
+# Returns parser function and total status word length
+# ==========================================================================
+def compile_status_parser(fields, offset=3):
+    lines = ['def parse_status(self, st):']
+    i = offset
+    for name, width in fields:
+        if width == 1:
+            lines.append('    self.status_%s = int(st[%d])' % (name, i))
+        else:
+            lines.append('    self.status_%s = int(st[%d:%d])' % (name, i, i + width))
+        i += width
+    ns = {}
+    exec(compile('\n'.join(lines), '<status parser>', 'exec'), ns)
+    return ns['parse_status'], i
+
+
+class keithley_dmm:
+
+    # Translation lists common to all models
+    ZERO_MODES = ['DISABLED', 'ENABLED', 'USING ZERO VALUE']
+    INSW_STATES = ['FRONT', 'REAR']
+    TRIGGER_MODES = ['CONTINUOUS ON TALK', 'ONE-SHOT ON TALK', 'CONTINUOUS ON GET', 'ONE-SHOT ON GET',
+                     'CONTINUOUS ON X', 'ONE-SHOT ON X', 'CONTINUOUS ON EXTERNAL', 'ONE-SHOT ON EXTERNAL']
+    # Function strings accepted by function() (functions the model does not have are rejected)
+    FUNCTION_ALIASES = {
+        'VDC': 0, 'DCV': 0,
+        'VAC': 1, 'ACV': 1,
+        'OHM': 2, 'OHMS': 2,
+        'ADC': 3, 'DCA': 3,
+        'AAC': 4, 'ACA': 4,
+        'VDB': 5,
+        'ADB': 6,
+        'OCO': 7,
+    }
+
+    # SRQ mask / serial poll status byte bits
+    SRQ_READING_OVERFLOW = 1
+    SRQ_STORE_FULL = 2
+    SRQ_STORE_HALF_FULL = 4
+    SRQ_READING_DONE = 8
+    SRQ_READY = 16
+    SRQ_ERROR = 32
+    SRQ_RQS = 64
+
+    # Settings restored after a reconnect: (command letter, status attribute suffix)
+    RESTORE_FIELDS = [('F', 'function'), ('R', 'range'), ('P', 'filter'), ('S', 'rate'), ('T', 'trigger'), ('M', 'srq')]
+
+    # ==========================================================================
+    # Generate status word parser when a model class is defined
+    # ==========================================================================
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if 'STATUS_FIELDS' in cls.__dict__:
+            cls._parse_status, cls.STATUS_LENGTH = compile_status_parser(cls.STATUS_FIELDS, len(cls.MODEL))
+
+    # ==========================================================================
+    # Class constructor: initialize GPIB to address the instrument, set output format and read status word
+    # ==========================================================================
+    def __init__(self, pad = None, port = 0, inst = None):
+        # Save instrument address (default primary address depends on model)
+        if pad is None:
+            pad = self.DEFAULT_PAD
+        self.pad = pad
+        self.port = port
+        if inst is None:
+            # Get a (possibly shared) session for the specified primary adderess and GPIB port from the session pool
+            self.resource_name = session.resource_name(pad, port)
+            self.inst = session.acquire(self.resource_name, self)
+        else:
+            # Use externally supplied session (e.g. simulator.simulated_instrument)
+            self.resource_name = None
+            self.inst = inst
+        # Units, unit code (see parser.UNIT_CODES), function prefix and overflow flag of last reading
+        self.units = None
+        self.unit_code = parser.UNKNOWN_CODE
+        self.reading_prefix = None
+        self.overflow = False
+        # Cached status: validity, time of last status word read and maximum age in seconds (None = never expires)
+        self.status_valid = False
+        self.status_time = None
+        self.status_max_age = None
+        # Zero value set with zero(2, val) (not part of the status word)
+        self.zero_value = 0.0
+        # Command fragments collected by an open transaction (None = no transaction)
+        self._pending = None
+        # Data store configuration (see store())
+        self.store_rate = None
+        self.store_count = None
+        self.store_start = None
+        self.store_cmd = None
+        # Fault recovery session proxy (see recovery, None when not enabled)
+        self.recovery = None
+        # Bus transaction statistics (see iostats, None until instrumentation is first enabled)
+        self.io_stats = None
+        iostats.register(self)
+        try:
+            # Configure the instrument to output data with prefix
+            self.inst.write('G0X')
+            # Read instrument status word
+            self.read_status()
+        except Exception:
+            # Wrong model or instrument not responding: do not leak the pooled session
+            self.close()
+            raise
+
+
+    # ==========================================================================
+    # Release pooled session (session gets closed when no other object uses it)
+    # ==========================================================================
+    def close(self):
+        if self.inst is not None:
+            self.inst = None
+            if self.resource_name is not None:
+                session.release(self.resource_name, self)
+
+
+    # ==========================================================================
+    # Context manager support
+    # ==========================================================================
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    # ==========================================================================
+    # Read datd fom instrument, determin unit ofmeasurement and return measurement value as float
+    # ==========================================================================
+    def read(self):
+        val = self._read()
+        # Save query timestamp
+        self.timestamp = time.localtime()
+        # return measurement value
+        return val
+
+
+    # ==========================================================================
+    # Read data from instrument without timestamping it, update units and return measurement value
+    # ==========================================================================
+    def _read(self):
+        # Read data from instrument
+        r = self.inst.read()
+
+        # Cut off any suffixes following the reading field
+        i = r.find(',')
+        if i >= 0:
+            r = r[:i]
+        # Convert measurement value (float() ignores surrounding whitespace)
+        val = float(r[4:])
+        self.overflow = r[0] == 'O'
+        # Use prefix to update units when it changes
+        pfx = r[1:4]
+        if pfx != self.reading_prefix:
+            self.reading_prefix = pfx
+            self.units = parser.PREFIX_UNITS.get(pfx, self.units)
+            self.unit_code = parser.PREFIX_CODES.get(pfx, parser.UNKNOWN_CODE)
+            # Function changed without our command (e.g. on the front panel): cached status is no longer valid
+            if pfx in self.READING_PREFIXES and self.READING_PREFIXES.index(pfx) != self.status_function:
+                self.invalidate_status()
+
+        # return measurement value
+        return val
+
+
+    # ==========================================================================
+    # Generate streaming.reading records (perf_counter_ns/time_ns timestamps, value, unit code)
+    # count: number of readings (None = endless), interval: sampling interval in seconds (None = no waiting)
+    # ==========================================================================
+    def stream(self, count=None, interval=None):
+        return streaming.generate(self, self._read, count, interval)
+
+
+    # ==========================================================================
+    # Take readings directly into a ringbuffer.reading_buffer, return number of readings taken
+    # ==========================================================================
+    def fill_buffer(self, buffer, count=None, interval=None):
+        return streaming.fill(self, self._read, buffer, count, interval)
+
+
+    # ==========================================================================
+    # Read instrument status word
+    # ==========================================================================
+    def read_status(self):
+
+        # Send "U0X" command to request instrument status word and read result
+        st = self.inst.query('U0X').strip()
+
+        # Sanity check the status word length and model number prefix
+        if st[0:3] != self.MODEL:
+            raise ValueError("Unexpected status word model prefix")
+        if len(st) != self.STATUS_LENGTH:
+            raise ValueError("Unexpected status word length")
+
+        # Split status word and save individual values (parser generated from STATUS_FIELDS)
+        self._parse_status(st)
+
+        # Mark cached status as valid
+        self.status_valid = True
+        self.status_time = time.monotonic()
+
+        # Return Status word
+        return st
+
+
+    # ==========================================================================
+    # Read status word only if cached status is invalid or older than status_max_age
+    # ==========================================================================
+    def refresh_status(self, force=False):
+        if (force or not self.status_valid or
+                (self.status_max_age is not None and time.monotonic() - self.status_time > self.status_max_age)):
+            self.read_status()
+
+
+    # ==========================================================================
+    # Mark cached status as invalid, forcing the next refresh_status() to query the instrument
+    # ==========================================================================
+    def invalidate_status(self):
+        self.status_valid = False
+    
+
+    # ==========================================================================
+    # Replace the bus session (below any session proxies, see iostats and recovery)
+    # ==========================================================================
+    def replace_session(self, new):
+        outer = None
+        s = self.inst
+        while getattr(type(s), 'SESSION_PROXY', False):
+            outer = s
+            s = s.inst
+        if outer is None:
+            self.inst = new
+        else:
+            outer.inst = new
+
+
+    # ==========================================================================
+    # Bus session below any session proxies
+    # ==========================================================================
+    def raw_session(self):
+        s = self.inst
+        while getattr(type(s), 'SESSION_PROXY', False):
+            s = s.inst
+        return s
+
+
+    # ==========================================================================
+    # Single command string restoring the cached configuration (e.g. after the instrument was power cycled)
+    # ==========================================================================
+    def restore_command(self):
+        cmd = 'G0'
+        for letter, field in self.RESTORE_FIELDS:
+            v = getattr(self, 'status_' + field, None)
+            if v is not None:
+                cmd += letter + str(v)
+        if self.status_zero == 2:
+            # Zero value has to be executed before zero mode gets enabled with it
+            cmd += 'V' + str(self.zero_value) + 'XZ2'
+        else:
+            # Z1 zeroes on the present input again, the previous zero baseline is not known
+            cmd += 'Z' + str(self.status_zero)
+        return cmd + 'X'
+
+
+    # ==========================================================================
+    # Re-open the pooled session in place and restore the cached configuration with one write
+    # (instead of creating a new object, which would query the status word again)
+    # ==========================================================================
+    def reconnect(self):
+        s = self.raw_session()
+        if self.resource_name is not None:
+            s = session.reopen(self.resource_name, s)
+            self.replace_session(s)
+        s.write(self.restore_command())
+
+
+    # ==========================================================================
+    # Read instrument error word
+    # ==========================================================================
+    def read_error(self):
+        er = self.inst.query('U1X')
+        return er
+
+
+    # ==========================================================================
+    # Send command to instrument, or add it to the open transaction
+    # ==========================================================================
+    def _send(self, cmd):
+        if self._pending is None:
+            self.inst.write(cmd + 'X')
+        else:
+            self._pending.append(cmd)
+
+
+    # ==========================================================================
+    # Check if a setting can be dropped from the open transaction because it matches the known instrument state
+    # ==========================================================================
+    def _unchanged(self, value, cached):
+        return self._pending is not None and self.status_valid and value == cached
+
+
+    # ==========================================================================
+    # Transaction: collect settings and send them as one command string with a single trailing X
+    #
+    #   with k.transaction():
+    #       k.function('OHM')
+    #       k.range(3)
+    # ==========================================================================
+    @contextlib.contextmanager
+    def transaction(self):
+        # Nested transactions are part of the outer one
+        if self._pending is not None:
+            yield self
+            return
+        self._pending = []
+        try:
+            yield self
+        except BaseException:
+            # Nothing was sent, but the cached state was already updated
+            self._pending = None
+            self.invalidate_status()
+            raise
+        cmd = ''.join(self._pending)
+        self._pending = None
+        if cmd:
+            self.inst.write(cmd + 'X')
+
+
+    # ==========================================================================
+    # Configure several settings in one bus transaction, settings that already match the known state are dropped
+    # ==========================================================================
+    def configure(self, function=None, range=None, zero=None, zero_value=0, filter=None, rate=None):
+        with self.transaction():
+            if function is not None:
+                self.function(function)
+            if range is not None:
+                self.range(range)
+            if zero is not None:
+                self.zero(zero, zero_value)
+            if filter is not None:
+                self.filter(filter)
+            if rate is not None:
+                self.rate(rate)
+
+
+    # ==========================================================================
+    # Set measurement range
+    # ==========================================================================
+    def range(self, rng):
+        # Check if input parameter is of valid type (integer)
+        if isinstance(rng, int):
+            # Check if input parameter value is in valid range
+            if rng>=0 and rng<=7:
+                # Send range command to instrument (unless unchanged in a transaction), update cached state and return requested range value
+                if not self._unchanged(rng, self.status_range):
+                    self._send('R'+str(rng))
+                    self.status_range = rng
+                return rng
+            else:
+                # else raise ValueError exception
+                raise ValueError("Only values from 0 to 7 represent valid measurement ranges")
+        else:
+            # else raise TypeError exception
+            raise TypeError
+
+
+    # ==========================================================================
+    # Set measurement function
+    # ==========================================================================
+    def function(self, fn):
+        fn = self.function_number(fn)
+        # Send function command to instrument (unless unchanged in a transaction), update cached state and return selected function number
+        if not self._unchanged(fn, self.status_function):
+            self._send("F"+str(fn))
+            self.status_function = fn
+        return fn
+
+
+    # ==========================================================================
+    # Convert function number or string to function number (without sending anything)
+    # ==========================================================================
+    def function_number(self, fn):
+        # check input parameter type
+        if isinstance(fn, int):
+            if not (fn>=0 and fn<len(self.FUNCTION_LIST)):
+                # raise ValueError exception for invalid function numbers
+                raise ValueError("Only integer values from 0 to " + str(len(self.FUNCTION_LIST)-1) + " represent valid functions")
+        elif isinstance(fn, str):
+            # Convert input string to upper case, remove whitespace characters including spaces in the midle of the string
+            fs = fn.upper().strip().replace(' ', '')
+            # Try to find a matching function to select
+            code = self.FUNCTION_ALIASES.get(fs)
+            if code is None or code >= len(self.FUNCTION_LIST):
+                raise ValueError("Unknown function string: " + str(fn))
+            fn = code
+        else:
+            # else raise TypeError exception
+            raise TypeError
+        return fn
+
+
+    # ==========================================================================
+    # Set zero
+    # ==========================================================================
+    def zero(self, mode=0, val=0):
+        if mode==0:
+            # Turn off zero mode
+            cmd = 'Z0'
+        elif mode==1:
+            # Turn on zero mode
+            cmd = 'Z1'
+        elif mode==2:
+            if val!=0:
+                # Set zero value and execute it before enabling zero mode with it
+                s = str(float(val))
+                cmd = 'V'+s+'XZ2'
+                self.zero_value = float(val)
+            else:
+                cmd = 'Z1'
+                mode = 1
+        else:
+            raise ValueError("Invalid zero mode value")
+        # Send command (zero value always gets sent) and update cached state
+        if mode==2 or not self._unchanged(mode, self.status_zero):
+            self._send(cmd)
+            self.status_zero = mode
+    
+
+    # ==========================================================================
+    # Set Digital Filter
+    # ==========================================================================
+    def filter(self, n):
+        if isinstance(n, int):
+            if n>=0 and n<=self.FILTER_MAX:
+                if not self._unchanged(n, self.status_filter):
+                    self._send('P'+str(n))
+                    self.status_filter = n
+            else:
+                raise ValueError("Filter parameter out of range (0 <= N <= " + str(self.FILTER_MAX) + ")")
+        else:
+            raise TypeError("Invalid input type. Filter parameter must be int")
+
+
+    # ==========================================================================
+    # Set integration rate / resolution (see RATE_MODES)
+    # ==========================================================================
+    def rate(self, n):
+        if isinstance(n, int):
+            if n>=0 and n<len(self.RATE_MODES):
+                if not self._unchanged(n, self.status_rate):
+                    self._send('S'+str(n))
+                    self.status_rate = n
+                return n
+            else:
+                raise ValueError("Rate parameter out of range (0 <= N <= " + str(len(self.RATE_MODES)-1) + ")")
+        else:
+            raise TypeError("Invalid input type. Rate parameter must be int")
+
+
+    # ==========================================================================
+    # Configure internal data store: storage interval (ms) and number of readings
+    # ==========================================================================
+    def store(self, rate, count):
+        cmd = datastore.store_command(rate, count)
+        self.store_rate = rate
+        self.store_count = count
+        self.store_start = None
+        self.store_cmd = cmd
+        return cmd
+
+
+    # ==========================================================================
+    # Arm data store (clears buffer and starts storing readings)
+    # ==========================================================================
+    def arm_store(self):
+        if self.store_cmd is None:
+            raise ValueError("Data store is not configured, call store() first")
+        self.inst.write(self.store_cmd)
+        self.store_start = time.monotonic()
+        self.status_data_store_rate = self.store_rate
+
+
+    # ==========================================================================
+    # Wait for data store to fill up
+    # ==========================================================================
+    def wait_store(self, timeout=None):
+        # Wait for service request if the instrument was set up to request service when the data store is full
+        if self.status_srq & self.SRQ_STORE_FULL:
+            self.wait_srq(timeout)
+            return
+        # Expected fill time from the moment the store was armed
+        t_full = self.store_start + self.store_count * self.store_rate / 1000.0
+        t_wait = t_full - time.monotonic()
+        if timeout is not None and t_wait > timeout:
+            raise TimeoutError("Data store will not be full within timeout")
+        if t_wait > 0:
+            time.sleep(t_wait)
+
+
+    # ==========================================================================
+    # Read all stored readings in one bulk transfer and return them as a NumPy structured array
+    # ==========================================================================
+    def read_store(self):
+        # Select readings with buffer location suffix from data store and read all of them at once
+        data = self.inst.query('G2B2X')
+        # Return to prefixed readings from A/D converter
+        self.inst.write('G0B0X')
+        return datastore.parse_store_dump(data, self.store_rate)
+
+
+    # ==========================================================================
+    # Acquire a block of readings: configure, arm and wait for the data store and read it out
+    # ==========================================================================
+    def acquire_block(self, rate, count, timeout=None):
+        self.store(rate, count)
+        self.arm_store()
+        self.wait_store(timeout)
+        return self.read_store()
+
+
+    # ==========================================================================
+    # Set trigger mode (see TRIGGER_MODES)
+    # ==========================================================================
+    def trigger_mode(self, mode):
+        if isinstance(mode, int):
+            if mode>=0 and mode<=7:
+                if not self._unchanged(mode, self.status_trigger):
+                    self._send('T'+str(mode))
+                    self.status_trigger = mode
+                return mode
+            else:
+                raise ValueError("Only values from 0 to 7 represent valid trigger modes")
+        else:
+            raise TypeError("Invalid input type. Trigger mode must be int")
+
+
+    # ==========================================================================
+    # Send group execute trigger (GET) to this instrument
+    # ==========================================================================
+    def trigger(self):
+        self.inst.assert_trigger()
+
+
+    # ==========================================================================
+    # Set SRQ mask: conditions on which the instrument requests service (sum of SRQ_* values)
+    # ==========================================================================
+    def srq_mask(self, mask):
+        if isinstance(mask, int):
+            if mask>=0 and mask<=63:
+                if not self._unchanged(mask, self.status_srq):
+                    self._send('M'+str(mask))
+                    self.status_srq = mask
+                return mask
+            else:
+                raise ValueError("SRQ mask out of range (0 <= mask <= 63)")
+        else:
+            raise TypeError("Invalid input type. SRQ mask must be int")
+
+
+    # ==========================================================================
+    # Wait for service request from this instrument (timeout in seconds, None waits forever)
+    # ==========================================================================
+    def wait_srq(self, timeout=None):
+        self.inst.wait_for_srq(None if timeout is None else int(timeout * 1000))
+
+
+    # ==========================================================================
+    # Serial poll instrument and return status byte
+    # ==========================================================================
+    def serial_poll(self):
+        return self.inst.read_stb()
+
+
+    # ==========================================================================
+    # Wait until a reading is done and read it
+    # ==========================================================================
+    def read_srq(self, timeout=None):
+        if not self.status_srq & self.SRQ_READING_DONE:
+            self.srq_mask(self.status_srq | self.SRQ_READING_DONE)
+        self.wait_srq(timeout)
+        return self.read()
+
+
+    # ==========================================================================
+    # asyncio counterparts of bus operations (run in the executor of the instrument's GPIB board)
+    # ==========================================================================
+    # (asyncio is only imported when these are used)
+    # ==========================================================================
+    async def read_async(self):
+        from KeithleyDMM import aio
+        return await aio.run(self, self.read)
+
+    async def read_status_async(self):
+        from KeithleyDMM import aio
+        return await aio.run(self, self.read_status)
+
+    async def function_async(self, fn):
+        from KeithleyDMM import aio
+        return await aio.run(self, self.function, fn)
+
+    async def range_async(self, rng):
+        from KeithleyDMM import aio
+        return await aio.run(self, self.range, rng)
+
+    async def zero_async(self, mode=0, val=0):
+        from KeithleyDMM import aio
+        return await aio.run(self, self.zero, mode, val)
+
+    async def filter_async(self, n):
+        from KeithleyDMM import aio
+        return await aio.run(self, self.filter, n)
+
+    async def rate_async(self, n):
+        from KeithleyDMM import aio
+        return await aio.run(self, self.rate, n)
+
+
+    # ==========================================================================
+    # Print message to display
+    # ==========================================================================
+    def print(self, t):
+        # Check input type
+        if isinstance(t, str):
+            # Check length
+            if len(t)<=10:
+                # Replace spaces with @ characters to properly display on instruments
+                t = t.replace(" ", "@")
+                # Convert to upper case for consistency
+                t = t.upper()
+                # Replace any upper case X (used as execute command) with lower case x (gets displayed instead of executed)
+                t = t.replace('X', 'x')
+                # Write comand and string to instrument
+                self.inst.write("D"+t+"X")
+            else:
+                raise ValueError("String too long")
+        else:
+            raise TypeError("Valid input type: string")
@@ -0,0 +1,247 @@
+#!/bin/python3
+import json
+import time
+import weakref
+
+# ==============================================================================
+# Bus transaction instrumentation
+#
+# When enabled for an instrument, its session (inst.inst) is replaced by a
+# proxy that times every bus operation, and its reading decoder is wrapped so
+# the time spent parsing readings is recorded separately ('parse'). Disabling
+# puts the original session back, so disabled instrumentation costs nothing.
+#
+# Statistics are kept per instrument and operation: call count, cumulative and
+# maximum time and a latency histogram with power of two microsecond buckets.
+# ==============================================================================
+
+# Number of histogram buckets: bucket 0 counts calls under 1 us, bucket b calls
+# from 2**(b-1) to 2**b us, the last bucket everything longer
+HIST_BUCKETS = 32
+
+# Instruments created so far and global enable flag (applied to instruments created later)
+_instruments = weakref.WeakSet()
+_enabled = False
+
+
+class op_stats:
+    __slots__ = ('count', 'total_ns', 'max_ns', 'hist')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.hist = [0] * HIST_BUCKETS
+
+    def add(self, ns):
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        b = (ns // 1000).bit_length()
+        self.hist[b if b < HIST_BUCKETS else HIST_BUCKETS - 1] += 1
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'total_s': self.total_ns / 1e9,
+            'mean_us': self.total_ns / self.count / 1e3 if self.count else 0.0,
+            'max_us': self.max_ns / 1e3,
+            # Histogram as {upper bucket edge in us: count}, empty buckets omitted
+            'hist_us': {str(1 << b): n for b, n in enumerate(self.hist) if n},
+        }
+
+
+class instrument_stats:
+
+    def __init__(self, name):
+        self.name = name
+        self.ops = {}
+
+    def add(self, op, ns):
+        s = self.ops.get(op)
+        if s is None:
+            s = self.ops[op] = op_stats()
+        s.add(ns)
+
+    def reset(self):
+        self.ops = {}
+
+    def snapshot(self):
+        return {op: s.snapshot() for op, s in self.ops.items()}
+
+
+# ==============================================================================
+# Session proxy timing bus operations (other attributes are passed through)
+# ==============================================================================
+class instrumented_session:
+
+    # Marks session proxies for keithley_dmm.replace_session()
+    SESSION_PROXY = True
+
+    def __init__(self, inst, stats):
+        self.inst = inst
+        self.stats = stats
+        # Duration of the last read(), used to split driver read time into bus and parse time
+        self.last_read_ns = 0
+
+    def __getattr__(self, name):
+        return getattr(self.inst, name)
+
+    def write(self, cmd):
+        t = time.perf_counter_ns()
+        try:
+            return self.inst.write(cmd)
+        finally:
+            self.stats.add('write', time.perf_counter_ns() - t)
+
+    def read(self):
+        t = time.perf_counter_ns()
+        try:
+            return self.inst.read()
+        finally:
+            self.last_read_ns = ns = time.perf_counter_ns() - t
+            self.stats.add('read', ns)
+
+    def query(self, cmd):
+        t = time.perf_counter_ns()
+        try:
+            return self.inst.query(cmd)
+        finally:
+            # Queries are fixed commands (status word, error word, data store dump), keep them apart
+            self.stats.add('query ' + cmd, time.perf_counter_ns() - t)
+
+    def read_stb(self):
+        t = time.perf_counter_ns()
+        try:
+            return self.inst.read_stb()
+        finally:
+            self.stats.add('read_stb', time.perf_counter_ns() - t)
+
+    def assert_trigger(self):
+        t = time.perf_counter_ns()
+        try:
+            return self.inst.assert_trigger()
+        finally:
+            self.stats.add('assert_trigger', time.perf_counter_ns() - t)
+
+    def wait_for_srq(self, timeout=None):
+        t = time.perf_counter_ns()
+        try:
+            return self.inst.wait_for_srq(timeout)
+        finally:
+            self.stats.add('wait_for_srq', time.perf_counter_ns() - t)
+
+
+# ==========================================================================
+# Underlying bus session below any session proxies
+# ==========================================================================
+def unwrap(session):
+    while getattr(type(session), 'SESSION_PROXY', False):
+        session = session.inst
+    return session
+
+
+# ==========================================================================
+# Find timing proxy in the session proxy chain of an instrument, return (proxy, object holding it) or (None, None)
+# ==========================================================================
+def _find(inst):
+    holder = inst
+    s = inst.inst
+    while getattr(type(s), 'SESSION_PROXY', False):
+        if isinstance(s, instrumented_session):
+            return s, holder
+        holder = s
+        s = s.inst
+    return None, None
+
+
+# ==========================================================================
+# Name of an instrument in snapshots
+# ==========================================================================
+def _name(inst):
+    if inst.resource_name is not None:
+        return inst.resource_name
+    return 'K' + inst.MODEL + '@' + hex(id(inst))
+
+
+# ==========================================================================
+# Called by instrument constructors: track instrument, instrument it if enabled globally
+# ==========================================================================
+def register(inst):
+    _instruments.add(inst)
+    if _enabled:
+        enable(inst)
+
+
+# ==========================================================================
+# Enable instrumentation of the listed instruments (no arguments: all instruments, including ones created later)
+# ==========================================================================
+def enable(*instruments):
+    global _enabled
+    if not instruments:
+        _enabled = True
+        instruments = list(_instruments)
+    for inst in instruments:
+        if inst.inst is None or _find(inst)[0] is not None:
+            continue
+        if inst.io_stats is None:
+            inst.io_stats = instrument_stats(_name(inst))
+        session = inst.inst = instrumented_session(inst.inst, inst.io_stats)
+        stats = inst.io_stats
+        read = type(inst)._read.__get__(inst)
+
+        # Driver reading decoder: time not spent in the bus read is parsing
+        def timed_read(read=read, session=session, stats=stats):
+            t = time.perf_counter_ns()
+            v = read()
+            stats.add('parse', time.perf_counter_ns() - t - session.last_read_ns)
+            return v
+        inst._read = timed_read
+
+
+# ==========================================================================
+# Disable instrumentation of the listed instruments (no arguments: all instruments), statistics are kept
+# ==========================================================================
+def disable(*instruments):
+    global _enabled
+    if not instruments:
+        _enabled = False
+        instruments = list(_instruments)
+    for inst in instruments:
+        proxy, holder = _find(inst)
+        if proxy is not None:
+            # Splice the proxy out, other proxies (e.g. recovery) stay in place
+            holder.inst = proxy.inst
+            inst.__dict__.pop('_read', None)
+
+
+# ==========================================================================
+# Clear statistics of the listed instruments (no arguments: all instruments)
+# ==========================================================================
+def reset(*instruments):
+    for inst in instruments or list(_instruments):
+        if inst.io_stats is not None:
+            inst.io_stats.reset()
+
+
+# ==========================================================================
+# Statistics of the listed instruments (no arguments: all instruments) as dict keyed by instrument name
+# ==========================================================================
+def snapshot(*instruments):
+    out = {}
+    for inst in instruments or list(_instruments):
+        if inst.io_stats is not None:
+            out[inst.io_stats.name] = inst.io_stats.snapshot()
+    return out
+
+
+# ==========================================================================
+# Statistics as JSON string, written to path if given
+# ==========================================================================
+def to_json(*instruments, path=None):
+    s = json.dumps({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'instruments': snapshot(*instruments)}, indent=2)
+    if path is not None:
+        with open(path, 'w') as f:
+            f.write(s)
+    return s
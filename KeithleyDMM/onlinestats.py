@@ -0,0 +1,230 @@
+#!/bin/python3
+import math
+import threading
+import collections
+
+# ==============================================================================
+# Incremental statistics over live readings
+#
+# Mean and variance are updated with Welford's numerically stable algorithm in
+# O(1) per sample. With a sliding window the oldest sample is removed with the
+# inverse update, and window min/max are tracked with monotonic queues.
+# ==============================================================================
+
+
+class running_stats:
+
+    # ==========================================================================
+    # Class constructor
+    # window: number of most recent samples to compute statistics over (None = all samples)
+    # hist:   optional histogram (low edge, high edge, number of bins)
+    # ==========================================================================
+    def __init__(self, window=None, hist=None):
+        if window is not None and (not isinstance(window, int) or window < 1):
+            raise ValueError("Window must be a positive int")
+        self.window = window
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.total = 0
+        # Samples in window and monotonic queues of (index, value) for window min/max
+        self._samples = collections.deque()
+        self._minq = collections.deque()
+        self._maxq = collections.deque()
+        self._min = math.inf
+        self._max = -math.inf
+        # Histogram
+        if hist is not None:
+            lo, hi, nbins = hist
+            if hi <= lo or nbins < 1:
+                raise ValueError("Invalid histogram parameters")
+            self.hist_low = float(lo)
+            self.hist_high = float(hi)
+            self.hist_counts = [0] * nbins
+            self._bin_scale = nbins / (self.hist_high - self.hist_low)
+        else:
+            self.hist_counts = None
+        self.hist_under = 0
+        self.hist_over = 0
+
+
+    # ==========================================================================
+    # Histogram bin of value (-1 below range, len(hist_counts) above range)
+    # ==========================================================================
+    def _bin(self, x):
+        b = int((x - self.hist_low) * self._bin_scale) if x >= self.hist_low else -1
+        return min(b, len(self.hist_counts))
+
+    def _hist_add(self, x, k):
+        b = self._bin(x)
+        if b < 0:
+            self.hist_under += k
+        elif b >= len(self.hist_counts):
+            self.hist_over += k
+        else:
+            self.hist_counts[b] += k
+
+
+    # ==========================================================================
+    # Add sample
+    # ==========================================================================
+    def update(self, x):
+        x = float(x)
+        i = self.total
+        self.total += 1
+
+        # Welford update
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+        if self.hist_counts is not None:
+            self._hist_add(x, 1)
+
+        if self.window is None:
+            if x < self._min:
+                self._min = x
+            if x > self._max:
+                self._max = x
+            return
+
+        self._samples.append(x)
+        while self._minq and self._minq[-1][1] >= x:
+            self._minq.pop()
+        self._minq.append((i, x))
+        while self._maxq and self._maxq[-1][1] <= x:
+            self._maxq.pop()
+        self._maxq.append((i, x))
+
+        # Remove sample leaving the window
+        if self.count > self.window:
+            old = self._samples.popleft()
+            self.count -= 1
+            delta = old - self.mean
+            self.mean -= delta / self.count
+            self._m2 -= delta * (old - self.mean)
+            if self._m2 < 0.0:
+                self._m2 = 0.0
+            if self.hist_counts is not None:
+                self._hist_add(old, -1)
+            first = i - self.window + 1
+            if self._minq[0][0] < first:
+                self._minq.popleft()
+            if self._maxq[0][0] < first:
+                self._maxq.popleft()
+
+
+    # ==========================================================================
+    # Derived statistics
+    # ==========================================================================
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def min(self):
+        if self.window is None:
+            return self._min if self.count else None
+        return self._minq[0][1] if self._minq else None
+
+    @property
+    def max(self):
+        if self.window is None:
+            return self._max if self.count else None
+        return self._maxq[0][1] if self._maxq else None
+
+
+    # ==========================================================================
+    # Return statistics as dict
+    # ==========================================================================
+    def snapshot(self):
+        out = {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.mean if self.count else None,
+            'std': self.std,
+            'min': self.min,
+            'max': self.max,
+        }
+        if self.hist_counts is not None:
+            out['hist'] = {
+                'low': self.hist_low,
+                'high': self.hist_high,
+                'counts': list(self.hist_counts),
+                'under': self.hist_under,
+                'over': self.hist_over,
+            }
+        return out
+
+
+class stats_engine:
+
+    # ==========================================================================
+    # Class constructor: statistics are kept separately for each (function, range) combination
+    # window, hist: see running_stats
+    # ==========================================================================
+    def __init__(self, window=None, hist=None):
+        self.window = window
+        self.hist = hist
+        self.stats = {}
+        self._lock = threading.Lock()
+
+
+    # ==========================================================================
+    # Add a reading taken with the instrument's current (cached) function and range
+    # ==========================================================================
+    def update(self, inst, value):
+        key = (inst.status_function, inst.status_range)
+        with self._lock:
+            s = self.stats.get(key)
+            if s is None:
+                s = self.stats[key] = running_stats(self.window, self.hist)
+            s.update(value)
+
+
+    # ==========================================================================
+    # Read instrument, update statistics and return measurement value
+    # ==========================================================================
+    def read(self, inst):
+        v = inst.read()
+        self.update(inst, v)
+        return v
+
+
+    # ==========================================================================
+    # Pass reading records of inst.stream() trough while updating statistics
+    # ==========================================================================
+    def attach(self, inst, readings):
+        for r in readings:
+            self.update(inst, r.value)
+            yield r
+
+
+    # ==========================================================================
+    # Get statistics dict of a function and range (None if no readings)
+    # ==========================================================================
+    def get(self, function, rng):
+        with self._lock:
+            s = self.stats.get((function, rng))
+            return s.snapshot() if s is not None else None
+
+
+    # ==========================================================================
+    # Return statistics of all functions and ranges as dict keyed by (function, range)
+    # ==========================================================================
+    def snapshot(self):
+        with self._lock:
+            return {k: s.snapshot() for k, s in self.stats.items()}
+
+
+    # ==========================================================================
+    # Remove all statistics
+    # ==========================================================================
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
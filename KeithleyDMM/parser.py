@@ -0,0 +1,107 @@
+#!/bin/python3
+
+# ==============================================================================
+# Table driven decoding of G0 format reading strings
+#
+# A reading consists of a state character ('N' normal, 'O' overflow), a three
+# character function prefix and the value, e.g. 'NDCV+1.23456E+0'. Readings may
+# be followed by comma separated suffixes (buffer location, channel) which are
+# ignored.
+# ==============================================================================
+
+# Function prefixes, their unit codes and unit strings
+UNIT_CODES = ['DCV', 'ACV', 'OHM', 'OCO', 'DCI', 'ACI', 'dBV', 'dBI', 'RAT']
+UNIT_NAMES = ['V DC', 'V AC', 'Ohm', 'Ohm', 'A DC', 'A AC', 'dB V', 'dB A', 'Ratio']
+# Unit code returned for readings with an unknown prefix
+UNKNOWN_CODE = -1
+
+# Prefix lookup tables used by single reading parsers
+PREFIX_CODES = {p: i for i, p in enumerate(UNIT_CODES)}
+PREFIX_UNITS = {p: UNIT_NAMES[i] for i, p in enumerate(UNIT_CODES)}
+
+
+# ==========================================================================
+# Parse a single reading string and return value, unit code and overflow flag
+# ==========================================================================
+def parse_reading(r):
+    i = r.find(',')
+    if i >= 0:
+        r = r[:i]
+    return float(r[4:]), PREFIX_CODES.get(r[1:4], UNKNOWN_CODE), r[0] == 'O'
+
+
+# ==========================================================================
+# Numeric keys of the three prefix characters (sorted) and matching unit codes for vectorized lookup
+# ==========================================================================
+def _prefix_key_table():
+    import numpy as np
+    keys = [(ord(p[0]) << 16) | (ord(p[1]) << 8) | ord(p[2]) for p in UNIT_CODES]
+    order = np.argsort(keys)
+    return np.array(keys, dtype=np.int32)[order], order.astype(np.int8)
+
+_key_table = None
+
+
+# ==========================================================================
+# Convert input (bytes buffer, str or sequence of str/bytes readings) to a 2D uint8 array with one reading per row
+# ==========================================================================
+def _reading_matrix(data):
+    import numpy as np
+
+    if isinstance(data, str):
+        data = data.encode('ascii')
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        buf = np.frombuffer(data, dtype=np.uint8)
+        # Fast path: a buffer of newline terminated readings of equal length can be reshaped without copying
+        nl = np.flatnonzero(buf == 10)
+        if len(nl) and nl[-1] == len(buf) - 1:
+            w = int(nl[0]) + 1
+            if len(buf) % w == 0 and np.all(np.diff(nl) == w):
+                return buf.reshape(-1, w)
+        lines = bytes(data).split()
+    else:
+        lines = data
+
+    a = np.array(lines, dtype='S')
+    if a.ndim != 1:
+        raise ValueError("Expected a one dimensional sequence of readings")
+    if a.itemsize == 0:
+        return np.zeros((len(a), 0), dtype=np.uint8)
+    return a.view(np.uint8).reshape(len(a), a.itemsize)
+
+
+# ==========================================================================
+# Parse many readings at once and return parallel NumPy arrays of values, unit codes and overflow flags
+# ==========================================================================
+def parse_readings(data):
+    import numpy as np
+    global _key_table
+
+    if _key_table is None:
+        _key_table = _prefix_key_table()
+    keys, codes = _key_table
+
+    m = _reading_matrix(data)
+    n = m.shape[0]
+    if n == 0 or m.shape[1] < 5:
+        if n:
+            raise ValueError("Readings too short")
+        return np.empty(0, np.float64), np.empty(0, np.int8), np.empty(0, np.bool_)
+
+    # Overflow flag from state character
+    overflow = m[:, 0] == ord('O')
+
+    # Look up unit codes from the three prefix characters
+    k = (m[:, 1].astype(np.int32) << 16) | (m[:, 2].astype(np.int32) << 8) | m[:, 3]
+    i = np.searchsorted(keys, k)
+    i[i >= len(keys)] = 0
+    unit = np.where(keys[i] == k, codes[i], UNKNOWN_CODE).astype(np.int8)
+
+    # Blank out everything from the first comma (suffixes) and line terminators, then convert values
+    v = m[:, 4:].copy()
+    v[np.logical_or.accumulate(v == ord(','), axis=1)] = 0
+    v[(v == 10) | (v == 13)] = 0
+    values = v.view('S' + str(v.shape[1])).ravel().astype(np.float64)
+
+    return values, unit, overflow
@@ -0,0 +1,152 @@
+#!/bin/python3
+import os
+import json
+import time
+
+from KeithleyDMM import onlinestats
+
+# ==============================================================================
+# Integration rate profiles
+#
+# Each integration rate (S command) trades reading speed for resolution. The
+# profiler measures readings per second and noise (standard deviation of the
+# readings of a steady input) at every rate for the current function and range,
+# and a profile store keeps the results so acquisition code can select the
+# fastest rate that meets a noise target.
+# ==============================================================================
+
+
+# ==========================================================================
+# Measure one rate: discard settle readings, then time count readings
+# Return dict with rate, count, readings_per_second, mean and std
+# ==========================================================================
+def measure(inst, rate, count=100, settle=2):
+    inst.rate(rate)
+    for i in range(settle):
+        inst.read()
+    s = onlinestats.running_stats()
+    read = inst.read
+    t = time.perf_counter()
+    for i in range(count):
+        s.update(read())
+    t = time.perf_counter() - t
+    return {
+        'rate': rate,
+        'count': count,
+        'readings_per_second': count / t if t > 0 else float('inf'),
+        'mean': s.mean,
+        'std': s.std,
+    }
+
+
+# ==========================================================================
+# Measure all rates (or the listed ones) for the current function and range,
+# restore the original rate and return a profile dict
+# ==========================================================================
+def profile(inst, count=100, settle=2, rates=None):
+    inst.refresh_status()
+    if rates is None:
+        rates = range(len(inst.RATE_MODES))
+    original = inst.status_rate
+    try:
+        results = [measure(inst, r, count, settle) for r in rates]
+    finally:
+        inst.rate(original)
+    return {
+        'model': inst.MODEL,
+        'function': inst.status_function,
+        'range': inst.status_range,
+        'filter': inst.status_filter,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+# ==========================================================================
+# Fastest rate of a profile dict whose noise is at most noise (None if no rate is good enough)
+# ==========================================================================
+def fastest(prof, noise):
+    best = None
+    for r in prof['results']:
+        if r['std'] <= noise:
+            if best is None or (r['readings_per_second'], -r['std']) > (best['readings_per_second'], -best['std']):
+                best = r
+    return best['rate'] if best is not None else None
+
+
+class profile_store:
+
+    # ==========================================================================
+    # Class constructor
+    # path: JSON file profiles are loaded from and saved to (None = keep in memory only)
+    # ==========================================================================
+    def __init__(self, path=None):
+        self.path = path
+        self.profiles = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.profiles = json.load(f)
+
+
+    # ==========================================================================
+    # Profile key: model, function and range
+    # ==========================================================================
+    @staticmethod
+    def key(model, function, rng):
+        return str(model) + '/' + str(function) + '/' + str(rng)
+
+
+    # ==========================================================================
+    # Add (or replace) a profile dict
+    # ==========================================================================
+    def add(self, prof):
+        self.profiles[self.key(prof['model'], prof['function'], prof['range'])] = prof
+
+
+    # ==========================================================================
+    # Get profile of model, function and range (None if not profiled)
+    # ==========================================================================
+    def get(self, model, function, rng):
+        return self.profiles.get(self.key(model, function, rng))
+
+
+    # ==========================================================================
+    # Write profiles to file
+    # ==========================================================================
+    def save(self):
+        if self.path is None:
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.profiles, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+    # ==========================================================================
+    # Profile the instrument's current function and range, store and save the result
+    # ==========================================================================
+    def measure(self, inst, count=100, settle=2, rates=None):
+        prof = profile(inst, count, settle, rates)
+        self.add(prof)
+        self.save()
+        return prof
+
+
+    # ==========================================================================
+    # Fastest rate meeting the noise target for the instrument's current function and range
+    # (None if not profiled or no rate is good enough)
+    # ==========================================================================
+    def fastest(self, inst, noise):
+        inst.refresh_status()
+        prof = self.get(inst.MODEL, inst.status_function, inst.status_range)
+        return fastest(prof, noise) if prof is not None else None
+
+
+    # ==========================================================================
+    # Set the fastest rate meeting the noise target, return it (None: rate is left unchanged)
+    # ==========================================================================
+    def select(self, inst, noise):
+        r = self.fastest(inst, noise)
+        if r is not None:
+            inst.rate(r)
+        return r
@@ -0,0 +1,248 @@
+#!/bin/python3
+import sys
+import time
+import collections
+
+from KeithleyDMM import session
+
+# ==============================================================================
+# Bus fault recovery
+#
+# When enabled for an instrument, its session is wrapped in a proxy that sets
+# a timeout for each kind of bus operation and handles timeouts and I/O errors
+# by retrying with exponential backoff. Before each retry the pooled session
+# is re-opened in place and the cached configuration is restored with a single
+# command (keithley_dmm.restore_command()), so a meter that was power cycled
+# comes back in the state the program set up.
+#
+# The time from the first failed operation to the next successful one is
+# recorded as a gap, so unattended runs have an exact account of missing data.
+# ==============================================================================
+
+
+# ==============================================================================
+# Data gap record:
+#   start_ns   wall clock time of the first failure (time.time_ns())
+#   end_ns     wall clock time communication was restored
+#   failures   number of failed operations in the gap
+#   reopens    number of session re-opens in the gap
+#   error      last error message
+# ==============================================================================
+gap = collections.namedtuple('gap', ['start_ns', 'end_ns', 'failures', 'reopens', 'error'])
+
+
+# ==========================================================================
+# Check if an exception is a bus fault worth retrying (timeouts, I/O errors, pyvisa I/O errors)
+# ==========================================================================
+def is_bus_error(err):
+    if isinstance(err, (TimeoutError, ConnectionError, OSError)):
+        return True
+    errors = sys.modules.get('pyvisa.errors')
+    return errors is not None and isinstance(err, errors.VisaIOError)
+
+
+class recovering_session:
+
+    # Marks session proxies for keithley_dmm.replace_session()
+    SESSION_PROXY = True
+
+    # ==========================================================================
+    # Class constructor (see enable())
+    # ==========================================================================
+    def __init__(self, driver, inst, timeout=None, timeouts=None, retries=5, backoff=0.05, max_backoff=5.0,
+                 reopen=True, log_size=1000):
+        self.inst = inst
+        self.driver = driver
+        self.timeout = timeout
+        self.timeouts = dict(timeouts or {})
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.reopen = reopen
+        # Timeout currently set on the session (seconds)
+        self._timeout = None
+        # Gap accounting
+        self.gaps = collections.deque(maxlen=log_size)
+        self.failures = 0
+        self.reopens = 0
+        self.gap_time_ns = 0
+        self._gap_start = None
+        self._gap_failures = 0
+        self._gap_reopens = 0
+        self._gap_error = None
+
+    def __getattr__(self, name):
+        return getattr(self.inst, name)
+
+
+    # ==========================================================================
+    # Bus operations
+    # ==========================================================================
+    def write(self, cmd):
+        return self._call('write', 'write', cmd)
+
+    def read(self):
+        return self._call('read', 'read')
+
+    def query(self, cmd):
+        return self._call('query', 'query', cmd)
+
+    def read_stb(self):
+        return self._call('read_stb', 'read_stb')
+
+    def assert_trigger(self):
+        return self._call('assert_trigger', 'assert_trigger')
+
+    # Without an explicit timeout the operation timeout is used, every retry waits again
+    def wait_for_srq(self, timeout=None):
+        if timeout is None:
+            t = self.timeouts.get('wait_for_srq', self.timeout)
+            timeout = None if t is None else int(t * 1000)
+        return self._call('wait_for_srq', 'wait_for_srq', timeout)
+
+
+    # ==========================================================================
+    # Set session timeout for operation (only when it differs from the one set)
+    # ==========================================================================
+    def _set_timeout(self, op):
+        t = self.timeouts.get(op, self.timeout)
+        if t is not None and t != self._timeout:
+            # Set on the bus session itself, not on a proxy below this one
+            s = self.inst
+            while getattr(type(s), 'SESSION_PROXY', False):
+                s = s.inst
+            s.timeout = t * 1000.0
+            self._timeout = t
+
+
+    # ==========================================================================
+    # Run operation, recover from bus errors
+    # ==========================================================================
+    def _call(self, op, method, *args):
+        self._set_timeout(op)
+        try:
+            result = getattr(self.inst, method)(*args)
+        except Exception as err:
+            if not is_bus_error(err):
+                raise
+            return self._recover(op, method, args, err)
+        if self._gap_start is not None:
+            self._close_gap()
+        return result
+
+
+    # ==========================================================================
+    # Retry operation with backoff, re-opening the session and restoring the configuration before each retry
+    # ==========================================================================
+    def _recover(self, op, method, args, err):
+        self._fail(err)
+        delay = self.backoff
+        attempt = 0
+        while self.retries is None or attempt < self.retries:
+            attempt += 1
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+            try:
+                self._reconnect()
+                self._set_timeout(op)
+                result = getattr(self.inst, method)(*args)
+            except Exception as e:
+                if not is_bus_error(e):
+                    raise
+                self._fail(e)
+                err = e
+                continue
+            self._close_gap()
+            return result
+        # Give up, the gap stays open until an operation succeeds again
+        raise err
+
+
+    # ==========================================================================
+    # Re-open pooled session and restore cached configuration
+    # ==========================================================================
+    def _reconnect(self):
+        if self.reopen and self.driver.resource_name is not None:
+            # Switches every driver object sharing the pooled session (proxies stay in place)
+            session.reopen(self.driver.resource_name, self.driver.raw_session())
+            self.reopens += 1
+            self._gap_reopens += 1
+            self._timeout = None
+        self._set_timeout('write')
+        self.inst.write(self.driver.restore_command())
+
+
+    # ==========================================================================
+    # Gap accounting
+    # ==========================================================================
+    def _fail(self, err):
+        self.failures += 1
+        if self._gap_start is None:
+            self._gap_start = time.time_ns()
+            self._gap_failures = 0
+            self._gap_reopens = 0
+        self._gap_failures += 1
+        self._gap_error = str(err)
+
+    def _close_gap(self):
+        end = time.time_ns()
+        self.gaps.append(gap(self._gap_start, end, self._gap_failures, self._gap_reopens, self._gap_error))
+        self.gap_time_ns += end - self._gap_start
+        self._gap_start = None
+
+
+    # ==========================================================================
+    # Gap statistics as dict (an open gap is reported with end_ns None)
+    # ==========================================================================
+    def report(self):
+        gaps = [g._asdict() for g in self.gaps]
+        if self._gap_start is not None:
+            gaps.append(gap(self._gap_start, None, self._gap_failures, self._gap_reopens, self._gap_error)._asdict())
+        return {
+            'failures': self.failures,
+            'reopens': self.reopens,
+            'gap_time_s': self.gap_time_ns / 1e9,
+            'gaps': gaps,
+        }
+
+
+# ==========================================================================
+# Enable fault recovery for an instrument, return the recovering session
+# timeout:     timeout in seconds for all operations (None = keep the session's timeout)
+# timeouts:    per operation timeouts in seconds, e.g. {'read': 1.0, 'query': 0.5, 'write': 0.2}
+#              (operations: write, read, query, read_stb, assert_trigger, wait_for_srq)
+# retries:     number of retries before the error is raised (None = retry until it succeeds)
+# backoff:     delay before the first retry in seconds, doubled for each further retry up to max_backoff
+# reopen:      re-open the pooled session before each retry
+# ==========================================================================
+def enable(inst, timeout=None, timeouts=None, retries=5, backoff=0.05, max_backoff=5.0, reopen=True, log_size=1000):
+    proxy, holder = _find(inst)
+    if proxy is not None:
+        return proxy
+    inst.inst = recovering_session(inst, inst.inst, timeout, timeouts, retries, backoff, max_backoff, reopen, log_size)
+    inst.recovery = inst.inst
+    return inst.inst
+
+
+# ==========================================================================
+# Disable fault recovery (other session proxies stay in place)
+# ==========================================================================
+def disable(inst):
+    proxy, holder = _find(inst)
+    if proxy is not None:
+        holder.inst = proxy.inst
+        inst.recovery = None
+
+
+# ==========================================================================
+# Find recovery proxy in the session proxy chain of an instrument, return (proxy, object holding it) or (None, None)
+# ==========================================================================
+def _find(inst):
+    holder = inst
+    s = inst.inst
+    while getattr(type(s), 'SESSION_PROXY', False):
+        if isinstance(s, recovering_session):
+            return s, holder
+        holder = s
+        s = s.inst
+    return None, None
@@ -0,0 +1,111 @@
+#!/bin/python3
+import time
+
+# ==============================================================================
+# Fixed size ring buffer of readings backed by preallocated NumPy arrays
+#
+# Every sample is stored twice, at position i and i + capacity. Any window of
+# up to capacity most recent samples is therefore one contiguous slice, so
+# windows are returned as views without copying, while appending stays O(1).
+# ==============================================================================
+
+
+class reading_buffer:
+
+    # ==========================================================================
+    # Class constructor: allocate storage for capacity readings
+    # ==========================================================================
+    def __init__(self, capacity):
+        import numpy as np
+        if not isinstance(capacity, int):
+            raise TypeError("Capacity must be int")
+        if capacity < 1:
+            raise ValueError("Capacity must be at least 1")
+        self.capacity = capacity
+        # Timestamps (time.perf_counter_ns()), values and unit codes (see parser.UNIT_CODES)
+        self._t = np.zeros(2 * capacity, dtype=np.int64)
+        self._v = np.zeros(2 * capacity, dtype=np.float64)
+        self._u = np.zeros(2 * capacity, dtype=np.int8)
+        # Offset converting perf_counter_ns() timestamps to time_ns() wall clock time
+        self.wall_offset_ns = time.time_ns() - time.perf_counter_ns()
+        # Next write position and total number of readings appended
+        self._i = 0
+        self.total = 0
+
+
+    # ==========================================================================
+    # Number of readings held
+    # ==========================================================================
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+
+    # ==========================================================================
+    # Append reading (O(1), oldest reading gets overwritten when full)
+    # ==========================================================================
+    def append(self, t_ns, value, unit):
+        i = self._i
+        j = i + self.capacity
+        self._t[i] = self._t[j] = t_ns
+        self._v[i] = self._v[j] = value
+        self._u[i] = self._u[j] = unit
+        i += 1
+        self._i = 0 if i == self.capacity else i
+        self.total += 1
+
+
+    # ==========================================================================
+    # Append streaming.reading record
+    # ==========================================================================
+    def append_reading(self, r):
+        self.append(r.t_ns, r.value, r.unit)
+
+
+    # ==========================================================================
+    # Append all reading records from an iterable (e.g. inst.stream())
+    # ==========================================================================
+    def extend(self, readings):
+        for r in readings:
+            self.append(r.t_ns, r.value, r.unit)
+
+
+    # ==========================================================================
+    # Views of the last n readings, oldest first: (timestamps, values, unit codes)
+    # The views are only valid until the same slots get overwritten by later appends.
+    # ==========================================================================
+    def last(self, n=None):
+        size = len(self)
+        n = size if n is None else min(n, size)
+        # Until the buffer wraps readings are at the start of the storage, after that
+        # the newest readings end at the second copy of the write position
+        end = self._i if self.total < self.capacity else self._i + self.capacity
+        start = end - n
+        return self._t[start:end], self._v[start:end], self._u[start:end]
+
+
+    # ==========================================================================
+    # Views of readings taken within the last given number of seconds
+    # now_ns: reference time (perf_counter_ns(), default is current time)
+    # ==========================================================================
+    def last_seconds(self, seconds, now_ns=None):
+        import numpy as np
+        if now_ns is None:
+            now_ns = time.perf_counter_ns()
+        t, v, u = self.last()
+        k = int(np.searchsorted(t, now_ns - int(seconds * 1e9), side='left'))
+        return t[k:], v[k:], u[k:]
+
+
+    # ==========================================================================
+    # Convert perf_counter_ns() timestamps to wall clock time in ns
+    # ==========================================================================
+    def wall_ns(self, t_ns):
+        return t_ns + self.wall_offset_ns
+
+
+    # ==========================================================================
+    # Remove all readings
+    # ==========================================================================
+    def clear(self):
+        self._i = 0
+        self.total = 0
@@ -0,0 +1,117 @@
+#!/bin/python3
+from KeithleyDMM import streaming
+
+# ==============================================================================
+# Channel list scanning with the Keithley 199 scanner option
+#
+# A channel list is compiled once into one command string per step, holding
+# only the settings that differ from the previous step of the (cyclic) list.
+# The instrument is put into one-shot on X trigger mode, so each step is one
+# write (settings, channel and trigger) and one read of the reading taken on
+# the newly closed channel.
+# ==============================================================================
+
+# Trigger mode used while scanning (one-shot on X: the command that closes a channel starts the conversion)
+TRIGGER_ONE_SHOT_X = 5
+
+
+class channel_list:
+
+    # ==========================================================================
+    # Class constructor
+    # inst:     keithley199 instrument
+    # channels: list of channel numbers or (channel, function, range) tuples, function/range
+    #           None (or omitted) is taken from the previous entry (the first entry uses the
+    #           instrument's settings when the list is created)
+    # ==========================================================================
+    def __init__(self, inst, channels):
+        if not channels:
+            raise ValueError("Empty channel list")
+        inst.refresh_status()
+        self.channels = []
+        self.steps = []
+        fn = inst.status_function
+        rng = inst.status_range
+        for c in channels:
+            if isinstance(c, int):
+                c = (c,)
+            ch = c[0]
+            if not isinstance(ch, int) or not 1 <= ch <= inst.SCANNER_CHANNELS:
+                raise ValueError("Scanner channel must be int from 1 to " + str(inst.SCANNER_CHANNELS))
+            if len(c) > 1 and c[1] is not None:
+                fn = inst.function_number(c[1])
+            if len(c) > 2 and c[2] is not None:
+                if not isinstance(c[2], int) or not 0 <= c[2] <= 7:
+                    raise ValueError("Only values from 0 to 7 represent valid measurement ranges")
+                rng = c[2]
+            self.channels.append(ch)
+            self.steps.append((ch, fn, rng))
+        self.units = [inst.FUNCTION_UNITS[fn] for ch, fn, rng in self.steps]
+        self.cycle = self._commands(self.steps[-1][1], self.steps[-1][2])
+
+
+    # ==========================================================================
+    # Command strings of all steps, starting from function fn and range rng
+    # ==========================================================================
+    def _commands(self, fn, rng):
+        cmds = []
+        for ch, f, r in self.steps:
+            cmd = ''
+            if f != fn:
+                cmd += 'F' + str(f)
+            # Range is sent again after a function change
+            if r != rng or f != fn:
+                cmd += 'R' + str(r)
+            cmds.append(cmd + 'N' + str(ch) + 'X')
+            fn = f
+            rng = r
+        return cmds
+
+
+    def __len__(self):
+        return len(self.steps)
+
+
+    # ==========================================================================
+    # Scan: take samples sweeps over the channel list (sweeps start interval seconds apart)
+    # Return channels x samples NumPy array, overflowed readings are NaN
+    # restore: return to the function, range, channel and trigger mode used before the scan
+    # ==========================================================================
+    def scan(self, inst, samples=1, interval=None, restore=True):
+        import numpy as np
+        inst.refresh_status()
+        saved = (inst.status_function, inst.status_range, inst.status_scaner, inst.status_trigger)
+        out = np.empty((len(self.steps), samples))
+        first = self._commands(inst.status_function, inst.status_range)
+        if inst.status_trigger != TRIGGER_ONE_SHOT_X:
+            first[0] = 'T' + str(TRIGGER_ONE_SHOT_X) + first[0]
+        write = inst.inst.write
+        read = inst._read
+        steps = self.steps
+        nan = float('nan')
+        try:
+            cmds = first
+            for n in streaming.ticks(samples, interval):
+                for i, cmd in enumerate(cmds):
+                    ch, fn, rng = steps[i]
+                    # Keep cached status in step with the instrument (avoids status invalidation by _read())
+                    inst.status_function = fn
+                    inst.status_range = rng
+                    inst.status_scaner = ch
+                    write(cmd)
+                    v = read()
+                    out[i, n] = nan if inst.overflow else v
+                cmds = self.cycle
+        except BaseException:
+            # State of the instrument is unknown after an interrupted scan
+            inst.invalidate_status()
+            raise
+        finally:
+            inst.status_trigger = TRIGGER_ONE_SHOT_X
+        if restore:
+            with inst.transaction():
+                inst.trigger_mode(saved[3])
+                inst.channel(saved[2])
+                inst.function(saved[0])
+                inst.range(saved[1])
+        return out
@@ -0,0 +1,195 @@
+#!/bin/python3
+import time
+import threading
+
+from KeithleyDMM import streaming
+from KeithleyDMM import onlinestats
+
+# ==============================================================================
+# Multi-rate sampling scheduler
+#
+# Every task reads one instrument at its own rate. Sample n of a task is
+# released at start + n * period (absolute times, so the schedule does not
+# drift) and is due one period later. Each GPIB board is served by its own
+# thread, so instruments on different boards never wait for each other. On a
+# board the ready task with the earliest deadline is read first (earliest
+# deadline first), which serves late and fast tasks before slow ones. A task
+# that falls more than one period behind skips the missed releases instead of
+# reading in a burst.
+# ==============================================================================
+
+
+class sampling_task:
+
+    # ==========================================================================
+    # Class constructor (see rate_scheduler.add())
+    # ==========================================================================
+    def __init__(self, inst, rate, callback=None, name=None):
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        self.inst = inst
+        self.rate = rate
+        self.period_ns = int(1e9 / rate)
+        self.callback = callback
+        self.name = name if name is not None else 'K' + inst.MODEL + '@' + str(inst.port) + ':' + str(inst.pad)
+        self.release_ns = 0
+        # Statistics
+        self.count = 0
+        self.missed = 0
+        self.skipped = 0
+        self.errors = 0
+        # Exceptions raised by the callback (counted, they do not stop the board thread)
+        self.callback_errors = 0
+        self.last_callback_error = None
+        self.last = None
+        # Start jitter (time from release to start of the reading) and lateness in microseconds
+        self.jitter = onlinestats.running_stats()
+        self.max_late_us = 0.0
+
+
+    @property
+    def deadline_ns(self):
+        return self.release_ns + self.period_ns
+
+
+    # ==========================================================================
+    # Take the released sample and schedule the next one
+    # ==========================================================================
+    def _run(self):
+        perf_ns = time.perf_counter_ns
+        start = perf_ns()
+        self.jitter.update((start - self.release_ns) / 1e3)
+        try:
+            v = self.inst._read()
+        except Exception:
+            self.errors += 1
+            v = None
+        end = perf_ns()
+        if v is not None:
+            self.count += 1
+            self.last = streaming.reading(end, time.time_ns(), v, self.inst.unit_code)
+        if end > self.deadline_ns:
+            self.missed += 1
+            late = (end - self.deadline_ns) / 1e3
+            if late > self.max_late_us:
+                self.max_late_us = late
+        # Next release on the fixed grid, skipping releases that have already passed
+        self.release_ns += self.period_ns
+        if end > self.release_ns + self.period_ns:
+            k = (end - self.release_ns) // self.period_ns
+            self.skipped += k
+            self.release_ns += k * self.period_ns
+        if v is not None and self.callback is not None:
+            try:
+                self.callback(self, self.last)
+            except Exception as err:
+                self.callback_errors += 1
+                self.last_callback_error = repr(err)
+
+
+    # ==========================================================================
+    # Task statistics as dict
+    # ==========================================================================
+    def report(self):
+        return {
+            'name': self.name,
+            'rate': self.rate,
+            'count': self.count,
+            'missed': self.missed,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'callback_errors': self.callback_errors,
+            'last_callback_error': self.last_callback_error,
+            'jitter_us': {
+                'mean': self.jitter.mean if self.jitter.count else None,
+                'std': self.jitter.std,
+                'max': self.jitter.max,
+            },
+            'max_late_us': self.max_late_us,
+        }
+
+
+class rate_scheduler:
+
+    def __init__(self):
+        self.tasks = []
+        self._threads = []
+        self._stop = threading.Event()
+
+
+    # ==========================================================================
+    # Add task reading inst rate times per second
+    # callback: optional function called with (task, streaming.reading) after each sample
+    # ==========================================================================
+    def add(self, inst, rate, callback=None, name=None):
+        task = sampling_task(inst, rate, callback, name)
+        self.tasks.append(task)
+        return task
+
+
+    # ==========================================================================
+    # Board thread: earliest deadline first over the tasks of one GPIB board
+    # ==========================================================================
+    def _board_loop(self, tasks):
+        perf_ns = time.perf_counter_ns
+        while not self._stop.is_set():
+            now = perf_ns()
+            ready = None
+            next_release = None
+            for t in tasks:
+                if t.release_ns <= now:
+                    if ready is None or t.deadline_ns < ready.deadline_ns:
+                        ready = t
+                elif next_release is None or t.release_ns < next_release:
+                    next_release = t.release_ns
+            if ready is not None:
+                ready._run()
+            else:
+                self._stop.wait((next_release - now) / 1e9)
+
+
+    # ==========================================================================
+    # Start one thread per GPIB board, all tasks are first released now
+    # ==========================================================================
+    def start(self):
+        self._stop.clear()
+        boards = {}
+        for t in self.tasks:
+            boards.setdefault(t.inst.port, []).append(t)
+        start = time.perf_counter_ns()
+        for t in self.tasks:
+            t.release_ns = start
+        self._threads = [threading.Thread(target=self._board_loop, args=(tasks,), name='GPIB' + str(port), daemon=True)
+                         for port, tasks in boards.items()]
+        for th in self._threads:
+            th.start()
+
+
+    # ==========================================================================
+    # Stop board threads (after the readings in progress)
+    # ==========================================================================
+    def stop(self):
+        self._stop.set()
+        for th in self._threads:
+            th.join()
+        self._threads = []
+
+
+    # ==========================================================================
+    # Run for duration seconds (None = until interrupted with Ctrl-C)
+    # ==========================================================================
+    def run(self, duration=None):
+        self.start()
+        try:
+            self._stop.wait(duration)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+    # ==========================================================================
+    # Statistics of all tasks
+    # ==========================================================================
+    def report(self):
+        return [t.report() for t in self.tasks]
@@ -0,0 +1,596 @@
+#!/bin/python3
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import struct
+import getopt
+import selectors
+import threading
+import collections
+
+from KeithleyDMM import cli
+from KeithleyDMM import streaming
+
+# ==============================================================================
+# Local reading server
+#
+# The server owns the driver instances and runs one acquisition loop. Readings
+# are broadcast to any number of clients connected over a Unix socket (address
+# is a path) or a TCP socket (address is a (host, port) tuple). Configuration
+# commands from clients are executed by the acquisition thread between reading
+# rounds, so bus access stays serialized.
+#
+# Framing: every frame is a header (payload length u16, frame type u8)
+# followed by the payload. Reading frames carry READING_STRUCT: instrument id
+# (u16), unit code (i8, see parser.UNIT_CODES), flags (u8), wall clock time
+# (i64, ns since epoch) and value (f64). All other frames carry UTF-8 JSON.
+#
+# Clients that fall more than max_backlog bytes behind are disconnected, so a
+# slow client never holds up the acquisition loop.
+# ==============================================================================
+
+FRAME_HEADER = struct.Struct('<HB')
+READING_STRUCT = struct.Struct('<HbBqd')
+
+# Frame types
+FRAME_READING = 1
+FRAME_HELLO = 2
+FRAME_COMMAND = 3
+FRAME_REPLY = 4
+
+# Reading flags
+FLAG_OVERFLOW = 1
+
+# Driver methods clients may call
+COMMANDS = ('function', 'range', 'filter', 'zero', 'rate', 'configure')
+
+MAX_BACKLOG = 1 << 20
+
+
+# ==========================================================================
+# Build frames
+# ==========================================================================
+def frame(ftype, payload):
+    return FRAME_HEADER.pack(len(payload), ftype) + payload
+
+def json_frame(ftype, obj):
+    return frame(ftype, json.dumps(obj).encode('utf-8'))
+
+
+# ==========================================================================
+# Split complete frames off the start of buffer, return (list of (type, payload), bytes consumed)
+# ==========================================================================
+def decode_frames(buf):
+    frames = []
+    pos = 0
+    n = len(buf)
+    hs = FRAME_HEADER.size
+    while n - pos >= hs:
+        length, ftype = FRAME_HEADER.unpack_from(buf, pos)
+        if n - pos - hs < length:
+            break
+        frames.append((ftype, bytes(buf[pos + hs:pos + hs + length])))
+        pos += hs + length
+    return frames, pos
+
+
+# ==========================================================================
+# Create socket for address (str: Unix socket path, tuple: TCP (host, port))
+# ==========================================================================
+def _socket(address):
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return s
+
+
+class _client:
+    __slots__ = ('sock', 'inbuf', 'out', 'writing')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = bytearray()
+        self.out = bytearray()
+        self.writing = False
+
+
+class reading_server:
+
+    # ==========================================================================
+    # Class constructor
+    # instruments: driver instances to read
+    # address:     Unix socket path or (host, port) tuple
+    # interval:    time between reading rounds in seconds (None = as fast as the bus allows)
+    # names:       instrument names sent to clients (default 'K<model>@<port>:<pad>')
+    # ==========================================================================
+    def __init__(self, instruments, address, interval=None, names=None, max_backlog=MAX_BACKLOG):
+        self.instruments = list(instruments)
+        self.address = address
+        self.interval = interval
+        if names is None:
+            names = ['K' + i.MODEL + '@' + str(i.port) + ':' + str(i.pad) for i in self.instruments]
+        self.names = list(names)
+        self.max_backlog = max_backlog
+        # Statistics
+        self.readings = 0
+        self.errors = 0
+        self.dropped_clients = 0
+        self._clients = {}
+        self._commands = queue.Queue()
+        # Frames handed from the acquisition thread to the I/O thread
+        self._lock = threading.Lock()
+        self._outbox = []
+        self._replies = []
+        self._woken = False
+        self._stop = threading.Event()
+        self._threads = []
+        self._listener = None
+
+
+    # ==========================================================================
+    # Number of connected clients
+    # ==========================================================================
+    @property
+    def clients(self):
+        return len(self._clients)
+
+
+    # ==========================================================================
+    # Open listening socket and start I/O and acquisition threads
+    # ==========================================================================
+    def start(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+        self._listener = _socket(self.address)
+        if not isinstance(self.address, str):
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(self.address)
+        self._listener.listen(128)
+        self._listener.setblocking(False)
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._io_loop, name='server-io', daemon=True),
+                         threading.Thread(target=self._acquisition_loop, name='server-acquisition', daemon=True)]
+        for t in self._threads:
+            t.start()
+
+
+    # ==========================================================================
+    # Stop threads and close all sockets
+    # ==========================================================================
+    def close(self):
+        if self._listener is None:
+            return
+        self._stop.set()
+        self._wake()
+        for t in self._threads:
+            t.join()
+        for c in list(self._clients.values()):
+            c.sock.close()
+        self._clients = {}
+        self._listener.close()
+        self._listener = None
+        self._wake_r.close()
+        self._wake_w.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    # ==========================================================================
+    # Run until interrupted (Ctrl-C)
+    # ==========================================================================
+    def serve_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+
+    # ==========================================================================
+    # Hand frames to the I/O thread
+    # ==========================================================================
+    def _wake(self):
+        if not self._woken:
+            self._woken = True
+            try:
+                self._wake_w.send(b'\x00')
+            except OSError:
+                pass
+
+    def _broadcast(self, data):
+        with self._lock:
+            self._outbox.append(data)
+            self._wake()
+
+    def _reply(self, client, data):
+        with self._lock:
+            self._replies.append((client, data))
+            self._wake()
+
+
+    # ==========================================================================
+    # Acquisition thread: read all instruments in turn, run client commands between rounds
+    # ==========================================================================
+    def _acquisition_loop(self):
+        header = FRAME_HEADER.pack(READING_STRUCT.size, FRAME_READING)
+        pack = READING_STRUCT.pack
+        wall_ns = time.time_ns
+        instruments = list(enumerate(self.instruments))
+        for n in streaming.ticks(None, self.interval):
+            if self._stop.is_set():
+                break
+            self._run_commands()
+            if not self._clients:
+                # Nobody is listening: do not read, only run commands
+                self._stop.wait(0.05)
+                continue
+            chunk = []
+            for i, inst in instruments:
+                try:
+                    v = inst._read()
+                except Exception:
+                    self.errors += 1
+                    continue
+                chunk.append(header + pack(i, inst.unit_code, FLAG_OVERFLOW if inst.overflow else 0, wall_ns(), v))
+            self.readings += len(chunk)
+            self._broadcast(b''.join(chunk))
+
+
+    # ==========================================================================
+    # Execute queued client commands
+    # ==========================================================================
+    def _run_commands(self):
+        while True:
+            try:
+                client, msg = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            # A client must never stop the shared acquisition loop: every failure becomes an error reply
+            reply = {'id': msg.get('id')}
+            try:
+                cmd = msg.get('cmd')
+                if cmd not in COMMANDS:
+                    raise ValueError("Unknown command: " + str(cmd)[:100])
+                inst = msg.get('inst', 0)
+                if isinstance(inst, str):
+                    inst = self.names.index(inst)
+                result = getattr(self.instruments[inst], cmd)(*msg.get('args', []), **msg.get('kwargs', {}))
+                reply['ok'] = True
+                reply['result'] = result
+                data = json_frame(FRAME_REPLY, reply)
+            except Exception as err:
+                reply = {'id': reply['id'], 'ok': False, 'error': str(err)[:1000], 'type': type(err).__name__}
+                try:
+                    data = json_frame(FRAME_REPLY, reply)
+                except Exception:
+                    # Id not serializable or too long
+                    data = json_frame(FRAME_REPLY, {'id': None, 'ok': False, 'error': 'Bad command', 'type': reply['type']})
+            self._reply(client, data)
+
+
+    # ==========================================================================
+    # I/O thread: accept clients, receive commands, send frames
+    # ==========================================================================
+    def _io_loop(self):
+        sel = selectors.DefaultSelector()
+        sel.register(self._listener, selectors.EVENT_READ)
+        sel.register(self._wake_r, selectors.EVENT_READ)
+        hello = json_frame(FRAME_HELLO, {'instruments': self.names})
+        try:
+            while not self._stop.is_set():
+                for key, mask in sel.select(0.5):
+                    if key.fileobj is self._listener:
+                        try:
+                            sock, addr = self._listener.accept()
+                        except BlockingIOError:
+                            continue
+                        sock.setblocking(False)
+                        c = _client(sock)
+                        c.out += hello
+                        self._clients[sock.fileno()] = c
+                        sel.register(sock, selectors.EVENT_READ, c)
+                        self._flush(sel, c)
+                    elif key.fileobj is self._wake_r:
+                        self._deliver(sel)
+                    else:
+                        c = key.data
+                        if mask & selectors.EVENT_READ:
+                            self._receive(sel, c)
+                        if mask & selectors.EVENT_WRITE and c.sock.fileno() in self._clients:
+                            self._flush(sel, c)
+        finally:
+            sel.close()
+
+
+    # ==========================================================================
+    # Move frames from the acquisition thread to client buffers and send them
+    # ==========================================================================
+    def _deliver(self, sel):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            data = b''.join(self._outbox)
+            replies = self._replies
+            self._outbox = []
+            self._replies = []
+            self._woken = False
+        for c, f in replies:
+            if c.sock.fileno() in self._clients:
+                c.out += f
+        for c in list(self._clients.values()):
+            if data:
+                c.out += data
+            if c.out:
+                self._flush(sel, c)
+
+
+    # ==========================================================================
+    # Send as much of a client's buffer as the socket takes, drop clients too far behind
+    # ==========================================================================
+    def _flush(self, sel, c):
+        try:
+            n = c.sock.send(c.out)
+            del c.out[:n]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._drop(sel, c)
+            return
+        if len(c.out) > self.max_backlog:
+            self.dropped_clients += 1
+            self._drop(sel, c)
+            return
+        writing = bool(c.out)
+        if writing != c.writing:
+            c.writing = writing
+            sel.modify(c.sock, selectors.EVENT_READ | selectors.EVENT_WRITE if writing else selectors.EVENT_READ, c)
+
+
+    # ==========================================================================
+    # Receive command frames from a client
+    # ==========================================================================
+    def _receive(self, sel, c):
+        try:
+            data = c.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(sel, c)
+            return
+        c.inbuf += data
+        frames, used = decode_frames(c.inbuf)
+        del c.inbuf[:used]
+        for ftype, payload in frames:
+            if ftype == FRAME_COMMAND:
+                try:
+                    msg = json.loads(payload.decode('utf-8'))
+                except ValueError:
+                    continue
+                if isinstance(msg, dict):
+                    self._commands.put((c, msg))
+
+
+    def _drop(self, sel, c):
+        self._clients.pop(c.sock.fileno(), None)
+        try:
+            sel.unregister(c.sock)
+        except (KeyError, ValueError):
+            pass
+        c.sock.close()
+
+
+# ==============================================================================
+# Reading received from a server:
+#   inst      instrument id (index into reading_client.instruments)
+#   t_ns      wall clock time (ns since epoch)
+#   value     measurement value
+#   unit      unit code (see parser.UNIT_CODES)
+#   overflow  overflow flag
+# ==============================================================================
+server_reading = collections.namedtuple('server_reading', ['inst', 't_ns', 'value', 'unit', 'overflow'])
+
+
+class reading_client:
+
+    # ==========================================================================
+    # Class constructor: connect to server at address and wait for its instrument list
+    # ==========================================================================
+    def __init__(self, address, timeout=5.0):
+        self.sock = _socket(address)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        self._buf = bytearray()
+        self._replies = {}
+        self._next_id = 1
+        # Received readings not yet taken with read()
+        self.readings = collections.deque()
+        self.instruments = None
+        while self.instruments is None:
+            self.receive(timeout)
+
+
+    def fileno(self):
+        return self.sock.fileno()
+
+
+    # ==========================================================================
+    # Receive available data once (waiting up to timeout seconds), return number of new readings
+    # ==========================================================================
+    def receive(self, timeout=None):
+        self.sock.settimeout(timeout)
+        try:
+            data = self.sock.recv(262144)
+        except socket.timeout:
+            return 0
+        if not data:
+            raise ConnectionError("Server closed connection")
+        self._buf += data
+        frames, used = decode_frames(self._buf)
+        del self._buf[:used]
+        n = 0
+        unpack = READING_STRUCT.unpack
+        append = self.readings.append
+        for ftype, payload in frames:
+            if ftype == FRAME_READING:
+                i, unit, flags, t_ns, value = unpack(payload)
+                append(server_reading(i, t_ns, value, unit, bool(flags & FLAG_OVERFLOW)))
+                n += 1
+            elif ftype == FRAME_REPLY:
+                msg = json.loads(payload.decode('utf-8'))
+                self._replies[msg.get('id')] = msg
+            elif ftype == FRAME_HELLO:
+                self.instruments = json.loads(payload.decode('utf-8'))['instruments']
+        return n
+
+
+    # ==========================================================================
+    # Next reading (None if none arrives within timeout seconds)
+    # ==========================================================================
+    def read(self, timeout=None):
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        while not self.readings:
+            if timeout is None:
+                self.receive(None)
+            else:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return None
+                self.receive(left)
+        return self.readings.popleft()
+
+    def __iter__(self):
+        while True:
+            yield self.read()
+
+
+    # ==========================================================================
+    # Run driver command on the server (inst: instrument id or name), return its result
+    # ==========================================================================
+    def command(self, inst, cmd, *args, timeout=5.0, **kwargs):
+        i = self._next_id
+        self._next_id += 1
+        self.sock.settimeout(timeout)
+        self.sock.sendall(json_frame(FRAME_COMMAND, {'id': i, 'inst': inst, 'cmd': cmd, 'args': list(args), 'kwargs': kwargs}))
+        deadline = time.monotonic() + timeout
+        while i not in self._replies:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise TimeoutError("No reply from server")
+            self.receive(left)
+        msg = self._replies.pop(i)
+        if not msg['ok']:
+            raise {'ValueError': ValueError, 'TypeError': TypeError}.get(msg.get('type'), RuntimeError)(msg['error'])
+        return msg.get('result')
+
+    def function(self, inst, fn):
+        return self.command(inst, 'function', fn)
+
+    def range(self, inst, rng):
+        return self.command(inst, 'range', rng)
+
+    def filter(self, inst, n):
+        return self.command(inst, 'filter', n)
+
+    def zero(self, inst, mode=0, val=0):
+        return self.command(inst, 'zero', mode, val)
+
+    def rate(self, inst, n):
+        return self.command(inst, 'rate', n)
+
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# ==============================================================================
+# When running as standalone program
+# ==============================================================================
+if __name__ == "__main__":
+
+    def print_usage():
+        print('''
+server.py - share instruments with local clients
+
+Usage:
+    python3 -m KeithleyDMM.server [-u PATH | -t PORT] [-i INTERVAL] [-S] [-h] MODEL:PAD[:GPIB_PORT] ...
+
+Options:
+    -u [path]       Listen on Unix socket path (default /tmp/keithley-dmm.sock)
+    -t [port]       Listen on TCP port on localhost instead
+    -i [seconds]    Time between reading rounds (default is as fast as the bus allows)
+    -S              Use simulated instruments
+    -h              Print this help message
+
+Example:
+    python3 -m KeithleyDMM.server -u /tmp/dmm.sock 196:7 199:1
+        ''')
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'u:t:i:Sh')
+    except getopt.GetoptError as err:
+        print(err)
+        print_usage()
+        sys.exit(2)
+
+    address = '/tmp/keithley-dmm.sock'
+    interval = None
+    simulate = False
+    for opt, arg in opts:
+        if opt == '-u':
+            address = arg
+        elif opt == '-t':
+            address = ('127.0.0.1', int(arg))
+        elif opt == '-i':
+            interval = float(arg)
+        elif opt == '-S':
+            simulate = True
+        elif opt == '-h':
+            print_usage()
+            sys.exit()
+    if not args:
+        print_usage()
+        sys.exit(2)
+
+    instruments = []
+    for spec in args:
+        f = spec.split(':')
+        model = f[0]
+        pad = int(f[1]) if len(f) > 1 else None
+        port = int(f[2]) if len(f) > 2 else 0
+        if simulate:
+            from KeithleyDMM import simulator
+            instruments.append(cli.load_model(model)(pad, port, inst=simulator.simulated_instrument(model)))
+        else:
+            instruments.append(cli.load_model(model)(pad, port))
+
+    reading_server(instruments, address, interval).serve_forever()
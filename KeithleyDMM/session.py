@@ -0,0 +1,125 @@
+#!/bin/python3
+import weakref
+import threading
+
+# ==============================================================================
+# Process wide pool of VISA sessions shared between all instrument objects
+# ==============================================================================
+
+# Shared pyvisa resource manager (created on first use)
+_resource_manager = None
+# Open sessions and their reference counts, keyed by resource name ('GPIB{port}::{pad}')
+_sessions = {}
+_refcounts = {}
+# Instrument objects using each session (switched to the new session by reopen())
+_owners = {}
+# Lock protecting the pool
+_lock = threading.RLock()
+
+
+# ==========================================================================
+# Build resource name string from GPIB port number and primary address
+# ==========================================================================
+def resource_name(pad, port=0):
+    return 'GPIB' + str(port) + '::' + str(pad)
+
+
+# ==========================================================================
+# Get (and if needed create) the shared pyvisa resource manager
+# ==========================================================================
+def resource_manager():
+    global _resource_manager
+    with _lock:
+        if _resource_manager is None:
+            # Import pyvisa only when the first session is needed
+            import pyvisa
+            _resource_manager = pyvisa.ResourceManager()
+        return _resource_manager
+
+
+# ==========================================================================
+# Build resource name string of the GPIB board (interface) itself
+# ==========================================================================
+def interface_name(port=0):
+    return 'GPIB' + str(port) + '::INTFC'
+
+
+# ==========================================================================
+# Open a session or reuse an already open one and increment its reference count
+# owner: instrument object using the session (needs replace_session(), see reopen())
+# ==========================================================================
+def acquire(name, owner=None):
+    with _lock:
+        if name in _sessions:
+            _refcounts[name] += 1
+        else:
+            _sessions[name] = resource_manager().open_resource(name)
+            _refcounts[name] = 1
+            _owners[name] = weakref.WeakSet()
+        if owner is not None:
+            _owners[name].add(owner)
+        return _sessions[name]
+
+
+# ==========================================================================
+# Decrement session reference count and close the session when it is no longer used
+# ==========================================================================
+def release(name, owner=None):
+    with _lock:
+        if name not in _sessions:
+            return
+        _owners[name].discard(owner)
+        _refcounts[name] -= 1
+        if _refcounts[name] <= 0:
+            inst = _sessions.pop(name)
+            del _refcounts[name]
+            del _owners[name]
+            inst.close()
+
+
+# ==========================================================================
+# Close and open a pooled session again (e.g. after bus errors), keeping its reference count
+# All owners registered with acquire() are switched to the new session, which is returned
+# old: session the caller was using, if it has already been replaced the current session is returned
+# Raises ValueError if the session is not open (a released session is not opened again)
+# ==========================================================================
+def reopen(name, old=None):
+    with _lock:
+        if name not in _sessions:
+            raise ValueError("Session not open: " + str(name))
+        current = _sessions[name]
+        if old is not None and current is not old:
+            return current
+        try:
+            current.close()
+        except Exception:
+            # The old session may already be unusable
+            pass
+        new = _sessions[name] = resource_manager().open_resource(name)
+        for owner in list(_owners[name]):
+            owner.replace_session(new)
+        return new
+
+
+# ==========================================================================
+# Return number of instrument objects currently using a session
+# ==========================================================================
+def refcount(name):
+    with _lock:
+        return _refcounts.get(name, 0)
+
+
+# ==========================================================================
+# Close all pooled sessions and the shared resource manager
+# ==========================================================================
+def close_all():
+    global _resource_manager
+    with _lock:
+        for inst in _sessions.values():
+            inst.close()
+        _sessions.clear()
+        _refcounts.clear()
+        _owners.clear()
+        if _resource_manager is not None:
+            _resource_manager.close()
+            _resource_manager = None
@@ -0,0 +1,203 @@
+#!/bin/python3
+import time
+
+# ==============================================================================
+# Reading ring buffer in shared memory
+#
+# Same layout idea as ringbuffer.reading_buffer (every sample stored twice, so
+# any window is one contiguous slice), placed in a multiprocessing shared
+# memory block so a writer process and any number of reader processes can use
+# it without pickling. There is one writer per buffer. The writer counts a
+# write as started before it stores a reading and increments the total count
+# after it. Readers copy the readings and then check the started count,
+# dropping only readings whose slots were written while copying.
+#
+# Block layout: header of HEADER_WORDS int64 values, then 2 * capacity
+# timestamps (int64, time.perf_counter_ns()), values (float64) and unit codes (int8)
+# ==============================================================================
+
+HEADER_WORDS = 8
+_TOTAL = 0
+_CAPACITY = 1
+_WALL_OFFSET = 2
+_HEARTBEAT = 3
+_ERRORS = 4
+_PID = 5
+_STARTED = 6
+
+
+class shared_reading_buffer:
+
+    # ==========================================================================
+    # Class constructor
+    # capacity given: create a new shared memory block (name None = generated name)
+    # capacity None:  attach to existing block name
+    # ==========================================================================
+    def __init__(self, name=None, capacity=None):
+        import numpy as np
+        from multiprocessing import shared_memory
+        self.owner = capacity is not None
+        if self.owner:
+            if not isinstance(capacity, int):
+                raise TypeError("Capacity must be int")
+            if capacity < 1:
+                raise ValueError("Capacity must be at least 1")
+            size = 8 * HEADER_WORDS + 2 * capacity * (8 + 8 + 1)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        buf = self.shm.buf
+        self._h = np.ndarray(HEADER_WORDS, dtype=np.int64, buffer=buf)
+        if self.owner:
+            self._h[:] = 0
+            self._h[_CAPACITY] = capacity
+            self._h[_WALL_OFFSET] = time.time_ns() - time.perf_counter_ns()
+        self.capacity = capacity = int(self._h[_CAPACITY])
+        offset = 8 * HEADER_WORDS
+        self._t = np.ndarray(2 * capacity, dtype=np.int64, buffer=buf, offset=offset)
+        offset += 16 * capacity
+        self._v = np.ndarray(2 * capacity, dtype=np.float64, buffer=buf, offset=offset)
+        offset += 16 * capacity
+        self._u = np.ndarray(2 * capacity, dtype=np.int8, buffer=buf, offset=offset)
+        # Writer position
+        self._i = int(self._h[_TOTAL]) % capacity
+
+
+    # ==========================================================================
+    # Header values
+    # ==========================================================================
+    @property
+    def total(self):
+        return int(self._h[_TOTAL])
+
+    @property
+    def wall_offset_ns(self):
+        return int(self._h[_WALL_OFFSET])
+
+    @property
+    def heartbeat_ns(self):
+        return int(self._h[_HEARTBEAT])
+
+    @property
+    def errors(self):
+        return int(self._h[_ERRORS])
+
+    @property
+    def pid(self):
+        return int(self._h[_PID])
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+
+    # ==========================================================================
+    # Writer: append reading
+    # ==========================================================================
+    def append(self, t_ns, value, unit):
+        n = self._h[_TOTAL] + 1
+        self._h[_STARTED] = n
+        i = self._i
+        j = i + self.capacity
+        self._t[i] = self._t[j] = t_ns
+        self._v[i] = self._v[j] = value
+        self._u[i] = self._u[j] = unit
+        i += 1
+        self._i = 0 if i == self.capacity else i
+        self._h[_TOTAL] = n
+
+
+    # ==========================================================================
+    # Writer: health information (time.monotonic_ns() heartbeat, error count, process id)
+    # ==========================================================================
+    def beat(self):
+        self._h[_HEARTBEAT] = time.monotonic_ns()
+
+    def error(self):
+        self._h[_ERRORS] += 1
+
+    def set_pid(self, pid):
+        self._h[_PID] = pid
+
+
+    # ==========================================================================
+    # Reader: copy readings appended since cursor (a previous total, 0 = from the start)
+    # Return (timestamps, values, unit codes, new cursor, number of readings lost)
+    # ==========================================================================
+    def read(self, cursor=0):
+        cap = self.capacity
+        total = self.total
+        n = total - cursor
+        lost = 0
+        if n > cap:
+            lost = n - cap
+            n = cap
+        # Newest reading ends at the write position, in the second copy once the buffer has wrapped
+        end = total % cap + cap if total >= cap else total
+        start = end - n
+        t = self._t[start:end].copy()
+        v = self._v[start:end].copy()
+        u = self._u[start:end].copy()
+        # Readings overwritten while copying: every write started by now (including one in
+        # progress) has overwritten the reading capacity positions before it
+        bad = (int(self._h[_STARTED]) - cap) - (total - n)
+        if bad > 0:
+            bad = min(bad, n)
+            t = t[bad:]
+            v = v[bad:]
+            u = u[bad:]
+            lost += bad
+        return t, v, u, total, lost
+
+
+    # ==========================================================================
+    # Reader: copy of the last n readings (timestamps, values, unit codes)
+    # ==========================================================================
+    def last(self, n=None):
+        total = self.total
+        n = min(total, self.capacity) if n is None else n
+        t, v, u, cursor, lost = self.read(max(0, total - n))
+        return t, v, u
+
+
+    # ==========================================================================
+    # Convert perf_counter_ns() timestamps to wall clock time in ns
+    # ==========================================================================
+    def wall_ns(self, t_ns):
+        return t_ns + self.wall_offset_ns
+
+
+    # ==========================================================================
+    # Detach from shared memory (and remove it if this object created it and unlink is True)
+    # ==========================================================================
+    def close(self, unlink=None):
+        if self.shm is None:
+            return
+        # Views must be released before the block can be closed
+        self._h = self._t = self._v = self._u = None
+        self.shm.close()
+        if unlink is None:
+            unlink = self.owner
+        if unlink:
+            self.shm.unlink()
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# ==========================================================================
+# Attach to a buffer from a process that was not started by the process owning
+# the buffer (the buffer is not removed when this process exits)
+# ==========================================================================
+def attach(name):
+    b = shared_reading_buffer(name)
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(b.shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return b
@@ -0,0 +1,512 @@
+#!/bin/python3
+import time
+import random
+
+# ==============================================================================
+# Simulated Keithley 196/199 instrument
+#
+# Implements the subset of the pyvisa resource interface used by the drivers
+# (write, read, query, close) and interprets the device dependent command
+# strings the same way the real instruments do, so it can be passed to the
+# driver constructors in place of a GPIB session:
+#
+#   k196 = KeithleyDMM.keithley196(inst=simulator.simulated_instrument('196'))
+# ==============================================================================
+
+# Reading prefixes for each measurement function
+READING_PREFIX = {
+    '196': ['DCV', 'ACV', 'OHM', 'DCI', 'ACI', 'dBV', 'dBI', 'OCO'],
+    '199': ['DCV', 'ACV', 'OHM', 'DCI', 'ACI', 'dBV', 'dBI'],
+}
+
+# Full scale values for ranges 1 to 7 of each measurement function (range 0 is autorange)
+FULL_SCALE = {
+    '196': [
+        [0.3, 3, 30, 300, 300, 300, 300],
+        [0.3, 3, 30, 300, 300, 300, 300],
+        [300, 3e3, 30e3, 300e3, 3e6, 30e6, 300e6],
+        [300e-6, 3e-3, 30e-3, 300e-3, 3, 3, 3],
+        [300e-6, 3e-3, 30e-3, 300e-3, 3, 3, 3],
+        [None]*7,
+        [None]*7,
+        [300, 3e3, 30e3, 30e3, 30e3, 30e3, 30e3],
+    ],
+    '199': [
+        [0.3, 3, 30, 300, 300, 300, 300],
+        [0.3, 3, 30, 300, 300, 300, 300],
+        [300, 3e3, 30e3, 300e3, 3e6, 30e6, 300e6],
+        [30e-3, 3, 3, 3, 3, 3, 3],
+        [30e-3, 3, 3, 3, 3, 3, 3],
+        [None]*7,
+        [None]*7,
+    ],
+}
+
+# Default simulated input signal for each measurement function
+DEFAULT_SIGNAL = [1.23456, 0.5, 1000.0, 1e-3, 1e-3, 1.23456, 1e-3, 1000.0]
+
+# Number of digits following the decimal point in readings
+READING_DIGITS = 5
+
+# Serial poll status byte bits (same as SRQ mask bits, plus RQS)
+STB_READING_OVERFLOW = 1
+STB_STORE_FULL = 2
+STB_STORE_HALF_FULL = 4
+STB_READING_DONE = 8
+STB_READY = 16
+STB_ERROR = 32
+STB_RQS = 64
+
+
+# ==============================================================================
+# Simulated GPIB board: instruments attached to the same bus share the SRQ line
+# ==============================================================================
+class simulated_bus:
+
+    def __init__(self):
+        self.instruments = []
+
+    # ==========================================================================
+    # Wait until any instrument on the bus requests service (timeout in ms, None waits forever)
+    # ==========================================================================
+    def wait_for_srq(self, timeout=25000):
+        _wait_srq(self.instruments, timeout)
+
+    # ==========================================================================
+    # Send group execute trigger to instruments on the bus
+    # ==========================================================================
+    def group_execute_trigger(self, *resources):
+        for r in resources:
+            r._trigger()
+
+    def close(self):
+        pass
+
+
+# ==========================================================================
+# Wait until one of the simulated instruments asserts SRQ
+# ==========================================================================
+def _wait_srq(instruments, timeout):
+    t_end = None if timeout is None else time.monotonic() + timeout / 1000.0
+    while True:
+        now = time.monotonic()
+        if any(i._srq_pending(now) for i in instruments):
+            return
+        # Sleep until next condition could become true or until timeout
+        t_next = [t for t in (i._next_event() for i in instruments) if t is not None]
+        t_next = min(t_next) if t_next else None
+        if t_end is not None and (t_next is None or t_next > t_end):
+            if t_end > now:
+                time.sleep(t_end - now)
+            if not any(i._srq_pending(time.monotonic()) for i in instruments):
+                raise TimeoutError("Timeout waiting for service request")
+            return
+        if t_next is None:
+            raise RuntimeError("No service request can occur with current SRQ mask")
+        time.sleep(max(0.0, t_next - now))
+
+
+# Approximate A/D conversion time (seconds) and noise factor for each integration rate (S0, S1, ...),
+# used when rate_timing is enabled
+RATE_TIMING = {
+    '196': [(0.003, 30.0), (0.003, 10.0), (0.0167, 1.0), (0.1, 0.3)],
+    '199': [(0.003, 10.0), (0.0167, 1.0)],
+}
+
+class simulated_instrument:
+
+    # ==========================================================================
+    # Class constructor: set model, simulated signal and transaction timing
+    # rate_timing: take conversion time and noise factor from RATE_TIMING for the selected rate
+    # ratio:       199 ratio mode (readings with 'RAT' prefix)
+    # ==========================================================================
+    def __init__(self, model='196', signal=None, noise=0.0, latency=0.0, jitter=0.0, seed=None, conversion_time=0.0, bus=None,
+                 rate_timing=False, ratio=False):
+        model = str(model)
+        if model not in READING_PREFIX:
+            raise ValueError("Unsupported model: " + model)
+        if ratio and model != '199':
+            raise ValueError("Ratio mode is only available on the 199")
+        self.model = model
+        # Ratio mode (199 front panel setting, reported with 'RAT' prefix), reset() keeps it
+        self.ratio = bool(ratio)
+        # Simulated input signal (float, or callable returning float) and relative noise amplitude
+        # (a list or tuple gives one signal per scanner channel, index 0 is used with all channels open)
+        self.signal = signal
+        self.noise = noise
+        # Per transaction latency and uniform jitter in seconds
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        # A/D conversion time in seconds (time between readings)
+        self.conversion_time = conversion_time
+        self.rate_timing = rate_timing
+        self._ready_time = 0.0
+        # Bus shared with other simulated instruments (for SRQ)
+        self.bus = bus
+        if bus is not None:
+            bus.instruments.append(self)
+        # Serial poll conditions that have already been reported
+        self._srq_seen = 0
+        # Reading latched by the last trigger (one-shot on GET mode)
+        self._latched = None
+        # pyvisa compatible timeout attribute (ms)
+        self.timeout = 2000
+        # Number of bus transactions served
+        self.transactions = 0
+        # Fault injection: number of upcoming transactions that time out, and whether the instrument is offline
+        # (failing transactions wait for the session timeout and raise TimeoutError)
+        self.faults = 0
+        self.offline = False
+        self.reset()
+
+
+    # ==========================================================================
+    # Set power-on state (as after the instrument has been power cycled)
+    # ==========================================================================
+    def reset(self):
+        # Front panel display message
+        self.display = ''
+        # Instrument state as reported in the status word
+        self.function = 0
+        self.data_format = 0
+        self.srq = 0
+        self.filter = 0
+        self.data_store_rate = 0
+        self.range = 0
+        self.rate = 0
+        self.trigger = 0
+        self.delay = 0
+        self.terminator = 0
+        self.zero = 0
+        self.zero_value = 0.0
+        self.scanner = 0
+        # Reading source (B command) and data store state
+        self.source = 0
+        self.store_size = 100
+        self.store_start = None
+        self.store = []
+        self.store_read = 0
+        # Pending V command value and output queue
+        self._value = 0.0
+        self._output = None
+
+
+    # ==========================================================================
+    # Wait for simulated transaction time
+    # ==========================================================================
+    def _transaction(self):
+        self.transactions += 1
+        if self.offline or self.faults:
+            if self.faults:
+                self.faults -= 1
+            time.sleep(self.timeout / 1000.0)
+            raise TimeoutError("Simulated instrument timeout")
+        if self.latency or self.jitter:
+            t = self.latency + self.random.uniform(-self.jitter, self.jitter)
+            if t > 0:
+                time.sleep(t)
+
+
+    # ==========================================================================
+    # Write command string to simulated instrument
+    # ==========================================================================
+    def write(self, cmd):
+        self._transaction()
+        self._execute(cmd)
+
+
+    # ==========================================================================
+    # Read response from simulated instrument
+    # ==========================================================================
+    def read(self):
+        self._transaction()
+        # Return queued response (status or error word) or take a new reading
+        if self._output is not None:
+            out = self._output
+            self._output = None
+            return out + '\r\n'
+        if self.source == 1:
+            # Next single reading from data store
+            self._fill_store()
+            if not self.store:
+                return self.reading() + '\r\n'
+            i = self.store_read % len(self.store)
+            self.store_read += 1
+            return self._store_reading(i) + '\r\n'
+        if self.source == 2:
+            # All data store readings in one transfer
+            self._fill_store()
+            return ','.join(self._store_reading(i) for i in range(len(self.store))) + '\r\n'
+        if self.trigger == 3:
+            # One-shot on GET: return reading taken at the last trigger
+            if self._latched is None:
+                raise TimeoutError("No reading triggered")
+            out = self._latched
+            self._latched = None
+            return out + '\r\n'
+        # Wait for A/D conversion to complete
+        now = time.monotonic()
+        if now < self._ready_time:
+            time.sleep(self._ready_time - now)
+        conversion_time = self.conversion_time
+        if self.rate_timing:
+            conversion_time = RATE_TIMING[self.model][self.rate][0]
+        self._ready_time = time.monotonic() + conversion_time
+        self._srq_seen &= ~STB_READING_DONE
+        return self.reading() + '\r\n'
+
+
+    # ==========================================================================
+    # Write command and read response
+    # ==========================================================================
+    def query(self, cmd):
+        self.write(cmd)
+        return self.read()
+
+
+    # ==========================================================================
+    # Group execute trigger addressed to this instrument
+    # ==========================================================================
+    def assert_trigger(self):
+        self._transaction()
+        self._trigger()
+
+    def _trigger(self):
+        if self.trigger in (2, 3):
+            self._latched = self.reading()
+
+
+    # ==========================================================================
+    # Serial poll: return status byte and clear reported service request conditions
+    # ==========================================================================
+    def read_stb(self):
+        self._transaction()
+        now = time.monotonic()
+        c = self._conditions(now)
+        pending = self._srq_pending(now)
+        self._srq_seen |= pending
+        return (c & 63) | (STB_RQS if pending else 0)
+
+
+    # ==========================================================================
+    # Wait for service request from this instrument (timeout in ms, None waits forever)
+    # ==========================================================================
+    def wait_for_srq(self, timeout=25000):
+        _wait_srq([self], timeout)
+
+
+    # ==========================================================================
+    # Current service request conditions
+    # ==========================================================================
+    def _conditions(self, now):
+        c = 0
+        if now >= self._ready_time:
+            c |= STB_READING_DONE
+        if self.store_start is not None and self.store_size:
+            n = int((now - self.store_start) * 1000.0 / self.data_store_rate) + 1
+            if n >= self.store_size:
+                c |= STB_STORE_FULL
+            if 2 * n >= self.store_size:
+                c |= STB_STORE_HALF_FULL
+        return c
+
+
+    # ==========================================================================
+    # Masked conditions that have not been reported by a serial poll yet
+    # ==========================================================================
+    def _srq_pending(self, now):
+        c = self._conditions(now)
+        # Forget reported conditions that are no longer true
+        self._srq_seen &= c
+        return c & self.srq & ~self._srq_seen
+
+
+    # ==========================================================================
+    # Time at which the next masked condition becomes true (None if no condition is expected)
+    # ==========================================================================
+    def _next_event(self):
+        t = []
+        if self.srq & STB_READING_DONE and not self._srq_seen & STB_READING_DONE:
+            t.append(self._ready_time)
+        if self.store_start is not None and self.store_size:
+            if self.srq & STB_STORE_FULL and not self._srq_seen & STB_STORE_FULL:
+                t.append(self.store_start + (self.store_size - 1) * self.data_store_rate / 1000.0)
+            if self.srq & STB_STORE_HALF_FULL and not self._srq_seen & STB_STORE_HALF_FULL:
+                t.append(self.store_start + ((self.store_size + 1) // 2 - 1) * self.data_store_rate / 1000.0)
+        return min(t) if t else None
+
+
+    # ==========================================================================
+    # Close session (nothing to release)
+    # ==========================================================================
+    def close(self):
+        pass
+
+
+    # ==========================================================================
+    # Parse and execute device dependent command string
+    # ==========================================================================
+    def _execute(self, cmd):
+        i = 0
+        n = len(cmd)
+        while i < n:
+            c = cmd[i]
+            i += 1
+            if c == 'X' or c.isspace():
+                continue
+            if c == 'D':
+                # Display message extends up to the next X
+                j = cmd.find('X', i)
+                j = n if j < 0 else j
+                self.display = cmd[i:j].replace('@', ' ')
+                i = j
+                continue
+            # Collect numeric argument
+            j = i
+            while j < n and (cmd[j].isdigit() or cmd[j] in '.+-eE'):
+                j += 1
+            arg = cmd[i:j]
+            i = j
+            self._command(c, arg)
+
+
+    # ==========================================================================
+    # Execute single command letter with its argument
+    # ==========================================================================
+    def _command(self, c, arg):
+        if c == 'V':
+            self._value = float(arg)
+            return
+        n = int(arg) if arg else 0
+        if c == 'F':
+            if n >= len(READING_PREFIX[self.model]):
+                raise ValueError("Invalid function: " + arg)
+            self.function = n
+        elif c == 'R':
+            if n > 7:
+                raise ValueError("Invalid range: " + arg)
+            self.range = n
+        elif c == 'Z':
+            if n == 1:
+                self.zero_value = self._input()
+            elif n == 2:
+                self.zero_value = self._value
+            self.zero = n
+        elif c == 'P':
+            self.filter = n
+        elif c == 'G':
+            self.data_format = n
+        elif c == 'S':
+            self.rate = n
+        elif c == 'T':
+            self.trigger = n
+        elif c == 'M':
+            self.srq = n
+        elif c == 'W':
+            self.delay = n
+        elif c == 'Y':
+            self.terminator = n
+        elif c == 'Q':
+            # (Re)start data store
+            self.data_store_rate = n
+            self.store = []
+            self.store_read = 0
+            self.store_start = time.monotonic() if n else None
+        elif c == 'I':
+            self.store_size = n
+        elif c == 'B':
+            self.source = n
+            self.store_read = 0
+        elif c == 'N':
+            self.scanner = n
+        elif c == 'U':
+            if n == 0:
+                self._output = self.status_word()
+            elif n == 1:
+                self._output = self.model + '0' * 8
+
+
+    # ==========================================================================
+    # Get simulated input signal value
+    # ==========================================================================
+    def _input(self):
+        signal = self.signal
+        if isinstance(signal, (list, tuple)):
+            signal = signal[self.scanner] if self.scanner < len(signal) else None
+        if callable(signal):
+            v = float(signal())
+        elif signal is not None:
+            v = float(signal)
+        else:
+            v = DEFAULT_SIGNAL[self.function]
+        if self.noise:
+            # Digital filter averages noise down
+            avg = max(1, self.filter)
+            noise = self.noise
+            if self.rate_timing:
+                noise *= RATE_TIMING[self.model][self.rate][1]
+            v += v * self.random.gauss(0, noise) / avg**0.5
+        return v
+
+
+    # ==========================================================================
+    # Take a reading and format it according to G0 data format
+    # ==========================================================================
+    def reading(self):
+        v = self._input()
+        if self.zero:
+            v -= self.zero_value
+        if self.ratio and self.model == '199':
+            pfx = 'RAT'
+        else:
+            pfx = READING_PREFIX[self.model][self.function]
+        # Check for overflow on fixed ranges
+        state = 'N'
+        if self.range:
+            fs = FULL_SCALE[self.model][self.function][self.range - 1]
+            if fs is not None and abs(v) > fs * 1.01:
+                state = 'O'
+        return state + pfx + '%+.*E' % (READING_DIGITS, v)
+
+
+    # ==========================================================================
+    # Add readings that would have been stored since the data store was started
+    # ==========================================================================
+    def _fill_store(self):
+        if self.store_start is None:
+            return
+        elapsed = time.monotonic() - self.store_start
+        n = int(elapsed * 1000.0 / self.data_store_rate) + 1
+        if self.store_size:
+            n = min(n, self.store_size)
+        while len(self.store) < n:
+            self.store.append(self.reading())
+
+
+    # ==========================================================================
+    # Format stored reading according to data format (G2 adds buffer location suffix)
+    # ==========================================================================
+    def _store_reading(self, i):
+        r = self.store[i]
+        if self.data_format in (1, 3):
+            r = r[4:]
+        if self.data_format in (2, 3):
+            r += ',B%03d' % i
+        return r
+
+
+    # ==========================================================================
+    # Assemble status word reflecting current instrument state
+    # ==========================================================================
+    def status_word(self):
+        if self.model == '196':
+            return ('196' + '0' + '0' + str(self.function) + str(self.data_format) + '0' + '0'
+                    + '%02d' % self.srq + '0' + '%02d' % self.filter + '%06d' % self.data_store_rate
+                    + str(self.range) + str(self.rate) + str(self.trigger) + '%05d' % self.delay
+                    + str(self.terminator) + str(self.zero) + '0')
+        else:
+            return ('199' + '0' + '0' + str(self.function) + str(self.data_format) + '0' + '0'
+                    + '%02d' % self.srq + '%02d' % self.scanner + str(int(self.ratio)) + str(self.filter)
+                    + '%06d' % self.data_store_rate + str(self.range) + str(self.rate) + str(self.trigger)
+                    + '%06d' % self.delay + str(self.terminator) + str(self.zero) + '0' + '1')
@@ -0,0 +1,141 @@
+#!/bin/python3
+import threading
+
+from KeithleyDMM import session
+from KeithleyDMM.dmm import keithley_dmm
+
+# ==============================================================================
+# Service request driven acquisition for several instruments sharing a GPIB board
+#
+# Instruments are programmed to request service when a reading is done. A single
+# thread waits for the SRQ line of the board and serial polls the instruments
+# only after it has been asserted, then reads the ones that requested service.
+# ==============================================================================
+
+# SRQ mask / serial poll status byte bits (defined by keithley_dmm, same for Keithley 196 and 199)
+SRQ_READING_OVERFLOW = keithley_dmm.SRQ_READING_OVERFLOW
+SRQ_STORE_FULL = keithley_dmm.SRQ_STORE_FULL
+SRQ_STORE_HALF_FULL = keithley_dmm.SRQ_STORE_HALF_FULL
+SRQ_READING_DONE = keithley_dmm.SRQ_READING_DONE
+SRQ_READY = keithley_dmm.SRQ_READY
+SRQ_ERROR = keithley_dmm.SRQ_ERROR
+SRQ_RQS = keithley_dmm.SRQ_RQS
+
+
+# ==========================================================================
+# Check if exception raised while waiting for SRQ is a timeout (builtin or pyvisa VI_ERROR_TMO)
+# ==========================================================================
+def is_timeout(err):
+    return isinstance(err, TimeoutError) or getattr(err, 'abbreviation', None) == 'VI_ERROR_TMO'
+
+
+# ==============================================================================
+# SRQ line of a GPIB board (pooled interface session)
+# ==============================================================================
+class board_srq:
+
+    def __init__(self, port=0):
+        from pyvisa import constants
+        self.name = session.interface_name(port)
+        self.intfc = session.acquire(self.name)
+        self.intfc.enable_event(constants.EventType.service_request, constants.EventMechanism.queue)
+
+    # ==========================================================================
+    # Wait for service request from any instrument on the board (timeout in ms, None waits forever)
+    # ==========================================================================
+    def wait_for_srq(self, timeout=25000):
+        from pyvisa import constants
+        if timeout is None:
+            timeout = constants.VI_TMO_INFINITE
+        self.intfc.wait_on_event(constants.EventType.service_request, timeout)
+
+    def close(self):
+        from pyvisa import constants
+        if self.intfc is not None:
+            self.intfc.disable_event(constants.EventType.service_request, constants.EventMechanism.queue)
+            self.intfc = None
+            session.release(self.name)
+
+
+class srq_dispatcher:
+
+    # ==========================================================================
+    # Class constructor: program SRQ mask of all instruments (which must share one GPIB board)
+    # ==========================================================================
+    def __init__(self, instruments, mask=SRQ_READING_DONE, board=None):
+        self.instruments = list(instruments)
+        if not self.instruments:
+            raise ValueError("No instruments")
+        ports = set(i.port for i in self.instruments)
+        if len(ports) != 1:
+            raise ValueError("All instruments must be on the same GPIB board, use one dispatcher per board")
+        self.port = ports.pop()
+        # Board SRQ line: open interface session unless supplied (e.g. simulator.simulated_bus)
+        self.own_board = board is None
+        self.board = board_srq(self.port) if board is None else board
+        # Instrument to serial poll first (round robin so no instrument gets starved)
+        self.next = 0
+        for i in self.instruments:
+            i.srq_mask(mask)
+
+
+    # ==========================================================================
+    # Wait for SRQ and return list of (instrument, status byte) of instruments requesting service
+    # ==========================================================================
+    def poll(self, timeout=None):
+        self.board.wait_for_srq(None if timeout is None else int(timeout * 1000))
+        n = len(self.instruments)
+        ready = []
+        last = None
+        for k in range(n):
+            j = (self.next + k) % n
+            i = self.instruments[j]
+            stb = i.serial_poll()
+            if stb & SRQ_RQS:
+                ready.append((i, stb))
+                last = j
+        if last is not None:
+            self.next = (last + 1) % n
+        return ready
+
+
+    # ==========================================================================
+    # Wait for SRQ and read all instruments with a reading done, return list of (instrument, value)
+    # ==========================================================================
+    def read(self, timeout=None):
+        out = []
+        for i, stb in self.poll(timeout):
+            if stb & SRQ_READING_DONE:
+                out.append((i, i.read()))
+        return out
+
+
+    # ==========================================================================
+    # Service instruments until stop event is set, calling callback(instrument, value) for each reading
+    # ==========================================================================
+    def run(self, callback, stop=None, timeout=1.0):
+        if stop is None:
+            stop = threading.Event()
+        while not stop.is_set():
+            try:
+                readings = self.read(timeout)
+            except Exception as err:
+                if is_timeout(err):
+                    continue
+                raise
+            for i, v in readings:
+                callback(i, v)
+
+
+    # ==========================================================================
+    # Release board interface session (if opened by the dispatcher)
+    # ==========================================================================
+    def close(self):
+        if self.own_board:
+            self.board.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,95 @@
+#!/bin/python3
+import time
+import collections
+
+from KeithleyDMM import parser
+
+# ==============================================================================
+# Streaming readings with high resolution timestamps
+# ==============================================================================
+
+
+# ==============================================================================
+# Reading record:
+#   t_ns     time.perf_counter_ns() timestamp (monotonic, for intervals)
+#   wall_ns  time.time_ns() timestamp (wall clock)
+#   value    measurement value
+#   unit     unit code (index into parser.UNIT_CODES)
+# ==============================================================================
+class reading(collections.namedtuple('reading', ['t_ns', 'wall_ns', 'value', 'unit'])):
+    __slots__ = ()
+
+    # Units string of the reading
+    @property
+    def units(self):
+        return parser.UNIT_NAMES[self.unit] if 0 <= self.unit < len(parser.UNIT_NAMES) else None
+
+    # Wall clock time as struct_time (local time)
+    def localtime(self):
+        return time.localtime(self.wall_ns // 1000000000)
+
+    # Wall clock time as float seconds since epoch
+    def timestamp(self):
+        return self.wall_ns / 1e9
+
+
+# ==========================================================================
+# Wait for sampling deadlines
+# count:    number of samples (None = endless)
+# interval: sampling interval in seconds (None = as fast as possible)
+#
+# Samples are scheduled on absolute deadlines (start + n * interval), so the
+# schedule does not drift. If a sample is late by more than one interval the
+# missed slots are skipped instead of taking samples in a burst.
+# ==========================================================================
+def ticks(count=None, interval=None):
+    perf_ns = time.perf_counter_ns
+    n = 0
+    if interval is None:
+        while count is None or n < count:
+            yield n
+            n += 1
+        return
+
+    step = int(interval * 1e9)
+    if step <= 0:
+        raise ValueError("Interval must be positive")
+    t_next = perf_ns()
+    while count is None or n < count:
+        now = perf_ns()
+        if now < t_next:
+            time.sleep((t_next - now) / 1e9)
+        yield n
+        n += 1
+        # Next deadline on the fixed grid, skipping slots that have already passed
+        t_next += step
+        now = perf_ns()
+        if now > t_next + step:
+            t_next += ((now - t_next) // step) * step
+
+
+# ==========================================================================
+# Generate reading records from an instrument
+# read: callable taking a reading and returning its value (inst.unit_code must be updated by it)
+# ==========================================================================
+def generate(inst, read, count=None, interval=None):
+    perf_ns = time.perf_counter_ns
+    wall_ns = time.time_ns
+    for n in ticks(count, interval):
+        v = read()
+        yield reading(perf_ns(), wall_ns(), v, inst.unit_code)
+
+
+# ==========================================================================
+# Take readings from an instrument and append them to a ringbuffer.reading_buffer
+# without creating per reading objects, return number of readings taken
+# ==========================================================================
+def fill(inst, read, buffer, count=None, interval=None):
+    perf_ns = time.perf_counter_ns
+    append = buffer.append
+    taken = 0
+    for n in ticks(count, interval):
+        v = read()
+        append(perf_ns(), v, inst.unit_code)
+        taken += 1
+    return taken
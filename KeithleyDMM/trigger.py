@@ -0,0 +1,108 @@
+#!/bin/python3
+import time
+import collections
+
+from KeithleyDMM import session
+from KeithleyDMM import iostats
+
+# ==============================================================================
+# Synchronized triggering of several instruments with one Group Execute Trigger
+#
+# All instruments are put into "one-shot on GET" trigger mode. A single GET bus
+# command is sent to all instruments on each GPIB board, so instruments sharing
+# a board take their readings at the same moment. With several boards the
+# triggers are sent one board after another and the time between the first and
+# the last one is reported as skew.
+# ==============================================================================
+
+# Trigger mode used for group triggering (one-shot on GET)
+TRIGGER_ONE_SHOT_GET = 3
+
+# Time aligned record of one group trigger:
+#   t_ns     perf_counter_ns() timestamp of the trigger (mean over boards)
+#   wall_ns  time_ns() wall clock timestamp of the trigger
+#   values   readings in instrument order
+#   units    reading units in instrument order
+#   skew_ns  time between the first and the last board trigger, plus the duration of the longest trigger transaction
+aligned_record = collections.namedtuple('aligned_record', ['t_ns', 'wall_ns', 'values', 'units', 'skew_ns'])
+
+
+class trigger_group:
+
+    # ==========================================================================
+    # Class constructor: switch instruments to trigger on GET and open board interface sessions
+    # interfaces: optional dict of {port: interface} (e.g. simulator.simulated_bus) used instead of pooled sessions
+    # ==========================================================================
+    def __init__(self, instruments, interfaces=None):
+        self.instruments = list(instruments)
+        # Group instruments by GPIB board
+        self.boards = collections.OrderedDict()
+        for i in self.instruments:
+            self.boards.setdefault(i.port, []).append(i)
+        # Open interface session of each board
+        self.interfaces = {}
+        self.own_interfaces = []
+        for port in self.boards:
+            if interfaces is not None and port in interfaces:
+                self.interfaces[port] = interfaces[port]
+            else:
+                name = session.interface_name(port)
+                self.interfaces[port] = session.acquire(name)
+                self.own_interfaces.append(name)
+        # Remember trigger modes so they can be restored
+        self.saved_modes = [i.status_trigger for i in self.instruments]
+        for i in self.instruments:
+            if i.status_trigger != TRIGGER_ONE_SHOT_GET:
+                i.trigger_mode(TRIGGER_ONE_SHOT_GET)
+        # Skew of the last trigger in ns
+        self.skew_ns = None
+
+
+    # ==========================================================================
+    # Send group execute trigger to all instruments, return (trigger time, wall clock time, skew) in ns
+    # ==========================================================================
+    def fire(self):
+        first = None
+        last = None
+        longest = 0
+        t_sum = 0
+        wall_ns = time.time_ns()
+        for port, insts in self.boards.items():
+            t0 = time.perf_counter_ns()
+            self.interfaces[port].group_execute_trigger(*[iostats.unwrap(i.inst) for i in insts])
+            t1 = time.perf_counter_ns()
+            if first is None:
+                first = t0
+            last = t0
+            longest = max(longest, t1 - t0)
+            t_sum += (t0 + t1) // 2
+        self.skew_ns = (last - first) + longest
+        return t_sum // len(self.boards), wall_ns, self.skew_ns
+
+
+    # ==========================================================================
+    # Trigger all instruments and collect their readings as one time aligned record
+    # ==========================================================================
+    def read(self):
+        t_ns, wall_ns, skew_ns = self.fire()
+        values = [i.read() for i in self.instruments]
+        units = [i.units for i in self.instruments]
+        return aligned_record(t_ns, wall_ns, values, units, skew_ns)
+
+
+    # ==========================================================================
+    # Restore trigger modes and release interface sessions
+    # ==========================================================================
+    def close(self):
+        for i, mode in zip(self.instruments, self.saved_modes):
+            if i.inst is not None and i.status_trigger != mode:
+                i.trigger_mode(mode)
+        for name in self.own_interfaces:
+            session.release(name)
+        self.own_interfaces = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,460 @@
+#!/bin/python3
+import io
+import os
+import sys
+import json
+import time
+import getopt
+import platform
+import functools
+import selectors
+import multiprocessing
+import tempfile
+import subprocess
+import tracemalloc
+
+# Make the KeithleyDMM package importable when running from the benchmarks directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import KeithleyDMM
+from KeithleyDMM import simulator
+from KeithleyDMM import binlog
+from KeithleyDMM import iostats
+from KeithleyDMM import acquisition
+from KeithleyDMM import server
+from KeithleyDMM import decimate
+
+
+# ==============================================================================
+# Session proxy accumulating wall clock and CPU time spent in bus transactions
+# ==============================================================================
+class timed_session:
+
+    def __init__(self, inst):
+        self.inst = inst
+        self.io_wall = 0.0
+        self.io_cpu = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self.inst, name)
+
+    def _timed(self, fn, *args):
+        w = time.perf_counter()
+        c = time.process_time()
+        try:
+            return fn(*args)
+        finally:
+            self.io_cpu += time.process_time() - c
+            self.io_wall += time.perf_counter() - w
+
+    def write(self, cmd):
+        return self._timed(self.inst.write, cmd)
+
+    def read(self):
+        return self._timed(self.inst.read)
+
+    def query(self, cmd):
+        return self._timed(self.inst.query, cmd)
+
+
+# ==========================================================================
+# Create driver instance connected to a timed simulator session
+# ==========================================================================
+def make_instrument(model, latency, jitter):
+    sim = simulator.simulated_instrument(model, noise=1e-5, latency=latency, jitter=jitter, seed=1)
+    if model == '196':
+        return KeithleyDMM.keithley196(inst=timed_session(sim))
+    return KeithleyDMM.keithley199(inst=timed_session(sim))
+
+
+# ==========================================================================
+# Return p-th percentile of a sorted list
+# ==========================================================================
+def percentile(data, p):
+    if not data:
+        return 0.0
+    k = (len(data) - 1) * p / 100.0
+    f = int(k)
+    c = min(f + 1, len(data) - 1)
+    return data[f] + (data[c] - data[f]) * (k - f)
+
+
+# ==========================================================================
+# Run one benchmark case and return its result record
+# ==========================================================================
+def run_case(name, sessions, fn, n, readings_per_call=1):
+    # Warm up
+    for i in range(min(100, n)):
+        fn()
+
+    # Measure transient memory allocated per call in a separate pass (tracing slows execution down)
+    m = min(1000, n)
+    tracemalloc.start()
+    alloc = 0
+    for i in range(m):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        alloc += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    # Timed pass
+    for s in sessions:
+        s.io_wall = 0.0
+        s.io_cpu = 0.0
+    lat = [0.0] * n
+    w0 = time.perf_counter()
+    c0 = time.process_time()
+    for i in range(n):
+        t = time.perf_counter()
+        fn()
+        lat[i] = time.perf_counter() - t
+    cpu = time.process_time() - c0
+    wall = time.perf_counter() - w0
+    io_wall = sum(s.io_wall for s in sessions)
+    io_cpu = sum(s.io_cpu for s in sessions)
+
+    lat.sort()
+    return {
+        'name': name,
+        'calls': n,
+        'readings_per_second': n * readings_per_call / wall,
+        'latency_us': {
+            'min': lat[0] * 1e6,
+            'p50': percentile(lat, 50) * 1e6,
+            'p90': percentile(lat, 90) * 1e6,
+            'p99': percentile(lat, 99) * 1e6,
+            'max': lat[-1] * 1e6,
+        },
+        'alloc_bytes_per_reading': alloc / (m * readings_per_call),
+        'wall_s': wall,
+        'cpu_s': cpu,
+        'io_wall_s': io_wall,
+        'io_cpu_s': io_cpu,
+        'parse_cpu_s': max(0.0, cpu - io_cpu),
+    }
+
+
+# ==========================================================================
+# Build list of benchmark cases
+# ==========================================================================
+def benchmark_cases(latency, jitter):
+    cases = []
+    for model in ('196', '199'):
+        k = make_instrument(model, latency, jitter)
+        cases.append(('read_' + model, [k.inst], k.read, 1))
+        cases.append(('read_status_' + model, [k.inst], k.read_status, 1))
+
+        def setup(k=k):
+            k.function('OHM')
+            k.range(3)
+            k.filter(1)
+            k.function('VDC')
+            k.range(0)
+            k.filter(0)
+        cases.append(('setup_' + model, [k.inst], setup, 1))
+
+        def configure(k=k):
+            k.configure(function='OHM', range=3, filter=1)
+            k.configure(function='VDC', range=0, filter=0)
+        cases.append(('configure_' + model, [k.inst], configure, 1))
+
+    # read() with bus transaction instrumentation enabled (compare with read_196)
+    k = make_instrument('196', latency, jitter)
+    session = k.inst
+    iostats.enable(k)
+    cases.append(('read_196_iostats', [session], k.read, 1))
+
+    # Loop pattern of example_dual_logger.py (without the one second sleep and with output kept in memory)
+    k196 = make_instrument('196', latency, jitter)
+    k199 = make_instrument('199', latency, jitter)
+    f = io.StringIO()
+
+    def dual_logger():
+        timestamp = time.localtime()
+        v1 = k196.read()
+        v2 = k199.read()
+        u1 = k196.units
+        u2 = k199.units
+        d = time.strftime('%Y-%m-%d', timestamp)
+        t = time.strftime('%H:%M:%S', timestamp)
+        out_str = (d + '; ' + t + '; ' + str(v1) + '; ' + u1 + '; ' + str(v2) + '; ' + u2)
+        f.write(out_str + '\n')
+        if f.tell() > 1 << 20:
+            f.seek(0)
+            f.truncate()
+    cases.append(('dual_logger', [k196.inst, k199.inst], dual_logger, 2))
+
+    # Same loop writing binary log records instead of CSV text
+    log = binlog.log_writer(os.path.join(tempfile.mkdtemp(), 'bench.kdl'), ['K196', 'K199'])
+
+    def binary_logger():
+        t = time.time_ns()
+        log.write(t, 0, k196.read(), k196.unit_code)
+        log.write(t, 1, k199.read(), k199.unit_code)
+    cases.append(('binary_logger', [k196.inst, k199.inst], binary_logger, 2))
+
+    return cases
+
+
+# ==========================================================================
+# Measure process start-up time (median wall time of runs of a python command line)
+# ==========================================================================
+STARTUP_COMMANDS = [
+    ('python', ['-c', 'pass']),
+    ('import_package', ['-c', 'import KeithleyDMM']),
+    ('import_model', ['-c', 'import KeithleyDMM; KeithleyDMM.keithley196']),
+    ('cli_help', ['-m', 'KeithleyDMM', '-h']),
+]
+
+def startup_times(runs):
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    results = []
+    for name, args in STARTUP_COMMANDS:
+        t = []
+        for i in range(runs):
+            w = time.perf_counter()
+            subprocess.run([sys.executable] + args, cwd=root, stdout=subprocess.DEVNULL, check=True)
+            t.append(time.perf_counter() - w)
+        t.sort()
+        results.append({'name': name, 'runs': runs, 'median_ms': percentile(t, 50) * 1e3, 'min_ms': t[0] * 1e3})
+    return results
+
+
+# ==========================================================================
+# Measure acquisition_manager throughput with 1, 2, 4 ... boards (one 196 and one 199 per board)
+# ==========================================================================
+def acquisition_scaling(max_boards, seconds, latency, jitter):
+    factory = functools.partial(acquisition.open_simulated, latency=latency, jitter=jitter)
+    results = []
+    boards = 1
+    while boards <= max_boards:
+        insts = [(m, pad, port) for port in range(boards) for m, pad in (('196', 7), ('199', 1))]
+        with acquisition.acquisition_manager(insts, capacity=100000, factory=factory) as m:
+            # Let workers start and open their instruments
+            time.sleep(0.5)
+            n0 = sum(h['readings'] for h in m.health().values())
+            w = time.perf_counter()
+            time.sleep(seconds)
+            n1 = sum(h['readings'] for h in m.health().values())
+            w = time.perf_counter() - w
+        results.append({'boards': boards, 'instruments': len(insts), 'readings_per_second': (n1 - n0) / w})
+        boards *= 2
+    return results
+
+
+# ==========================================================================
+# Reading server process for server_fanout()
+# ==========================================================================
+def _serve(address, latency, jitter, stop):
+    insts = [acquisition.open_simulated('196', 7, 0, latency=latency, jitter=jitter),
+             acquisition.open_simulated('199', 1, 0, latency=latency, jitter=jitter)]
+    with server.reading_server(insts, address):
+        stop.wait()
+
+
+# ==========================================================================
+# Measure readings delivered per subscriber by a reading server with 1, 10 and 100 subscribers
+# ==========================================================================
+def server_fanout(subscribers, seconds, latency, jitter):
+    address = os.path.join(tempfile.mkdtemp(), 'bench.sock')
+    stop = multiprocessing.Event()
+    p = multiprocessing.Process(target=_serve, args=(address, latency, jitter, stop))
+    p.start()
+    results = []
+    try:
+        while not os.path.exists(address):
+            time.sleep(0.01)
+        for n in subscribers:
+            clients = [server.reading_client(address) for i in range(n)]
+            sel = selectors.DefaultSelector()
+            for c in clients:
+                sel.register(c, selectors.EVENT_READ, c)
+            received = 0
+            dropped = 0
+            w = time.perf_counter()
+            end = w + seconds
+            while time.perf_counter() < end and len(sel.get_map()):
+                for key, mask in sel.select(0.1):
+                    c = key.data
+                    try:
+                        received += c.receive(None)
+                    except ConnectionError:
+                        sel.unregister(c)
+                        dropped += 1
+                    c.readings.clear()
+            w = time.perf_counter() - w
+            sel.close()
+            for c in clients:
+                c.close()
+            results.append({'subscribers': n, 'readings_per_second_per_subscriber': received / n / w,
+                            'readings_per_second_total': received / w, 'dropped': dropped})
+            # Let the server notice the disconnects
+            time.sleep(0.2)
+    finally:
+        stop.set()
+        p.join()
+    return results
+
+
+# ==========================================================================
+# Measure CPU cost per reading of the decimation stages (synthetic 1 kHz readings in chunks)
+# ==========================================================================
+def decimation_cost(n, chunk=1000):
+    import numpy as np
+    t = np.arange(n, dtype=np.int64) * 1000000
+    v = np.random.default_rng(0).normal(0.0, 1e-6, n)
+    stages = [
+        ('block_average_100', decimate.block_average(100)),
+        ('envelope_1s', decimate.envelope(1.0)),
+        ('pyramid_1s_x10_3', decimate.pyramid(1.0, 10, 3)),
+    ]
+    results = []
+    for name, stage in stages:
+        c = time.process_time()
+        for i in range(0, n, chunk):
+            stage.push(t[i:i + chunk], v[i:i + chunk])
+        stage.flush()
+        c = time.process_time() - c
+        results.append({'name': name, 'readings': n, 'cpu_ns_per_reading': c / n * 1e9})
+    return results
+
+
+# ==========================================================================
+# Print results table
+# ==========================================================================
+def print_results(results):
+    print('%-20s %12s %10s %10s %10s %10s %10s' % ('case', 'readings/s', 'p50 us', 'p99 us', 'alloc B', 'parse cpu', 'io cpu'))
+    for r in results:
+        print('%-20s %12.0f %10.1f %10.1f %10.0f %10.3f %10.3f' % (
+            r['name'], r['readings_per_second'], r['latency_us']['p50'], r['latency_us']['p99'],
+            r['alloc_bytes_per_reading'], r['parse_cpu_s'], r['io_cpu_s']))
+
+
+def print_scaling(results):
+    print('%-20s %12s' % ('boards', 'readings/s'))
+    for r in results:
+        print('%-20d %12.0f' % (r['boards'], r['readings_per_second']))
+
+
+def print_fanout(results):
+    print('%-20s %12s %12s %8s' % ('subscribers', 'per sub/s', 'total/s', 'dropped'))
+    for r in results:
+        print('%-20d %12.0f %12.0f %8d' % (r['subscribers'], r['readings_per_second_per_subscriber'],
+                                          r['readings_per_second_total'], r['dropped']))
+
+
+def print_decimation(results):
+    print('%-20s %12s' % ('decimation', 'cpu ns/rdg'))
+    for r in results:
+        print('%-20s %12.1f' % (r['name'], r['cpu_ns_per_reading']))
+
+
+def print_startup(results):
+    print('%-20s %12s %10s' % ('start-up', 'median ms', 'min ms'))
+    for r in results:
+        print('%-20s %12.1f %10.1f' % (r['name'], r['median_ms'], r['min_ms']))
+
+
+# ==============================================================================
+# When running as standalone program
+# ==============================================================================
+if __name__ == "__main__":
+
+    def print_usage():
+        print('''
+bench_keithley.py - driver throughput benchmarks against the simulated instrument backend
+
+Usage:
+    bench_keithley.py [-n CALLS] [-l LATENCY] [-j JITTER] [-k CASE] [-s RUNS] [-b BOARDS] [-f] [-o FILE] [-h]
+
+Options:
+    -n [calls]      Number of timed calls per case (default 20000)
+    -l [seconds]    Simulated per-transaction latency (default 0)
+    -j [seconds]    Simulated per-transaction jitter (default 0)
+    -k [case]       Only run cases whose name contains this string
+    -s [runs]       Number of runs per start-up time measurement (default 10, 0 = skip)
+    -b [boards]     Measure multi-board acquisition throughput for up to this many boards
+                    (1, 2, 4 ..., default 4, 0 = skip; uses a latency of 0.5 ms if -l is not given)
+    -f              Skip reading server fan-out measurement (1, 10 and 100 subscribers)
+    -o [file]       Write JSON results to file (default bench_results.json)
+    -h              Print this help message
+        ''')
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'n:l:j:k:s:b:fo:h')
+    except getopt.GetoptError as err:
+        print(err)
+        print_usage()
+        sys.exit(1)
+
+    n = 20000
+    latency = 0.0
+    jitter = 0.0
+    select = None
+    startup_runs = 10
+    max_boards = 4
+    fanout = True
+    out_file = 'bench_results.json'
+    for opt, arg in opts:
+        if opt == '-n':
+            n = int(arg)
+        elif opt == '-l':
+            latency = float(arg)
+        elif opt == '-j':
+            jitter = float(arg)
+        elif opt == '-k':
+            select = arg
+        elif opt == '-s':
+            startup_runs = int(arg)
+        elif opt == '-b':
+            max_boards = int(arg)
+        elif opt == '-f':
+            fanout = False
+        elif opt == '-o':
+            out_file = arg
+        elif opt == '-h':
+            print_usage()
+            sys.exit(0)
+
+    results = []
+    for name, sessions, fn, per_call in benchmark_cases(latency, jitter):
+        if select is None or select in name:
+            results.append(run_case(name, sessions, fn, n, per_call))
+
+    print_results(results)
+
+    decimation = decimation_cost(1000000)
+    print('')
+    print_decimation(decimation)
+
+    startup = startup_times(startup_runs) if startup_runs > 0 else []
+    if startup:
+        print('')
+        print_startup(startup)
+
+    # Without bus latency the simulated workers are CPU bound, use a typical GPIB transaction time
+    scaling = acquisition_scaling(max_boards, 1.0, latency or 0.0005, jitter) if max_boards > 0 else []
+    if scaling:
+        print('')
+        print_scaling(scaling)
+
+    fanout_results = server_fanout((1, 10, 100), 1.0, latency or 0.0005, jitter) if fanout else []
+    if fanout_results:
+        print('')
+        print_fanout(fanout_results)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'latency_s': latency,
+        'jitter_s': jitter,
+        'results': results,
+        'decimation': decimation,
+        'startup': startup,
+        'acquisition_scaling': scaling,
+        'server_fanout': fanout_results,
+    }
+    with open(out_file, 'w') as f:
+        json.dump(report, f, indent=2)
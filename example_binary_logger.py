@@ -0,0 +1,35 @@
+#!/bin/python3
+import time
+import sys
+
+# Import Keithley DMM library
+import KeithleyDMM
+from KeithleyDMM import binlog
+
+# Instrument connection settings
+gpib_port = 0
+k196_addr = 7
+k199_addr = 1
+
+# Instantiate instruments
+k196 = KeithleyDMM.keithley196(k196_addr, gpib_port)
+k199 = KeithleyDMM.keithley199(k199_addr, gpib_port)
+
+# Open new binary log file with start time in its name (instrument id 0 = K196, 1 = K199)
+log = binlog.log_writer(time.strftime('Log_%Y-%m-%d_%H-%M-%S.kdl'), ['K196', 'K199'])
+
+try:
+    print('Hit ctrl-c to stop logging.')
+    # Loop untill stoprd by ctrl-c
+    while(1):
+        # Read instruments and append one record per reading
+        for inst_id, inst in enumerate((k196, k199)):
+            v = inst.read()
+            log.write(time.time_ns(), inst_id, v, inst.unit_code, binlog.FLAG_OVERFLOW if inst.overflow else 0)
+        # Wait for a bit before repeating
+        time.sleep(1)
+
+except KeyboardInterrupt:
+    # Close file and exit (convert to CSV with: python3 -m KeithleyDMM.binlog export LOGFILE CSVFILE)
+    log.close()
+    sys.exit(0)
@@ -0,0 +1,41 @@
+#!/bin/python3
+import time
+import sys
+import json
+
+# Import Keithley DMM library
+import KeithleyDMM
+from KeithleyDMM import scheduler
+
+# Instrument connection settings and sampling rates (readings per second)
+gpib_port = 0
+k196_addr = 7
+k199_addr = 1
+k196_rate = 10.0
+k199_rate = 0.5
+
+# Instantiate instruments
+k196 = KeithleyDMM.keithley196(k196_addr, gpib_port)
+k199 = KeithleyDMM.keithley199(k199_addr, gpib_port)
+
+# Open new .csv log file with start time in its name
+f = open(time.strftime('Log_%Y-%m-%d_%H-%M-%S.csv'), 'a')
+
+# Write one line per reading: date; time; instrument; value; units
+def log(task, r):
+    d = time.strftime('%Y-%m-%d; %H:%M:%S', r.localtime())
+    f.write(d + '; ' + task.name + '; ' + str(r.value) + '; ' + str(r.units) + '\n')
+
+# Read each instrument at its own rate
+s = scheduler.rate_scheduler()
+s.add(k196, k196_rate, log, 'K196')
+s.add(k199, k199_rate, log, 'K199')
+
+print('Hit ctrl-c to stop logging.')
+# Run untill stopped by ctrl-c
+s.run()
+
+# Close file, print timing statistics and exit
+f.close()
+print(json.dumps(s.report(), indent=2))
+sys.exit(0)